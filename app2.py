@@ -1,44 +1,25 @@
 import streamlit as st
-from groq import Groq
+import os
 from apiKey import GROQ_API_KEY
+from chat_ui import (add_turn, get_chat, init_session_state, render_streamed_reply, render_transcript,
+                     save_session_state, settings, start_metrics_endpoint, stream_response)
+from stage_metrics import get_metrics
 
-# Initialize the Groq client
-client = Groq(api_key=GROQ_API_KEY)
-
-# Initialize conversation history and input state in Streamlit session state
-if 'conversation_history' not in st.session_state:
-    st.session_state.conversation_history = []
-if 'user_input' not in st.session_state:
-    st.session_state.user_input = ""
+# Text replies are kept shorter than spoken ones
+MAX_REPLY_TOKENS = 150
 
 def generate_response(user_input):
     """Generate a response using Llama 3 and maintain conversation context."""
-    # Add the current user input to the conversation history
-    st.session_state.conversation_history.append({"role": "user", "content": user_input})
-
-    # Create a completion with the conversation history
-    completion = client.chat.completions.create(
-        model="llama3-8b-8192",
-        messages=st.session_state.conversation_history,  # Send the entire conversation history
-        temperature=0.7,
-        max_tokens=150,
-        top_p=0.9,
-        stream=True,
-        stop=None,
-    )
-
-    # Gather the response text
-    response_text = ""
-    for chunk in completion:
-        if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
-            response_text += chunk.choices[0].delta.content or ""
-
-    # Add the response to the conversation history
-    st.session_state.conversation_history.append({"role": "assistant", "content": response_text})
-
-    return response_text
+    return "".join(stream_response(user_input, MAX_REPLY_TOKENS))
 
 def main():
+    # The session state, chat core and transcript are the voice page's, without its speech stack
+    settings.update(api_key=GROQ_API_KEY, voice=False)
+    # Stage latencies are also appended to METRICS_JSONL when it is set
+    get_metrics(jsonl_path=os.getenv('METRICS_JSONL'))
+    start_metrics_endpoint()
+    init_session_state()
+
     st.markdown("""
         <style>
         body {
@@ -97,30 +78,30 @@ def main():
     st.markdown('<h1 class="centered-title">🤖 Text-based Chatbot</h1>', unsafe_allow_html=True)
 
     # If conversation history is empty, start with an introductory message
-    if len(st.session_state.conversation_history) == 0:
+    if get_chat().count(st.session_state.session_id) == 0:
         introduction = "Hello! I'm Edusync's chatbot. I'm here to help you with your learning journey. How are you feeling today about your studies?"
-        st.session_state.conversation_history.append({"role": "assistant", "content": introduction})
+        add_turn("assistant", introduction)
         st.write(introduction)
 
     st.subheader("Conversation")
-    # Display the conversation history
-    chat_html = '<div class="chat-container">'
-    for msg in st.session_state.conversation_history:
-        if msg['role'] == 'user':
-            chat_html += f'<div class="chat-bubble user-bubble">You: {msg["content"]}</div>'
-        else:
-            chat_html += f'<div class="chat-bubble bot-bubble">Bot: {msg["content"]}</div>'
-    chat_html += '</div>'
-    st.markdown(chat_html, unsafe_allow_html=True)
+    # Display the latest turns of the conversation
+    render_transcript()
+
+    # Replies are streamed here as they are generated
+    stream_placeholder = st.empty()
 
     # Input field for the user to type a message
     st.subheader("Type your message:")
     user_input = st.text_area("", height=100, key="user_input")
 
+    # Saved before sending, the rerun after a reply ends the run early
+    save_session_state()
+
     # Button to submit the message
     if st.button("Send"):
         if user_input.strip():  # Ensure the input is not empty
-            response = generate_response(user_input.strip())
+            response = render_streamed_reply(stream_placeholder, user_input.strip(),
+                                             stream_response(user_input.strip(), MAX_REPLY_TOKENS))
             # Clear the input field and conversation history
             st.session_state.user_input = ""  # This line can be omitted if input field is cleared automatically
             st.experimental_rerun()  # Rerun the app to apply changes
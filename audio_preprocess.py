@@ -0,0 +1,175 @@
+"""Preprocessing of voice recordings uploaded from the browser.
+
+A recording is decoded, downmixed to mono, resampled to 16 kHz, normalised to
+a steady loudness and trimmed of leading and trailing silence before it is
+recognised. Every step works on whole NumPy arrays (frames are reshaped into a
+matrix rather than looped over), and recordings are processed on a pool of
+worker processes, so many sessions can upload at once without holding up their
+script threads.
+
+WAV (what the browser recorder produces) is decoded with the standard library.
+Other formats (webm, ogg, mp3, m4a, flac) are decoded with ffmpeg, which must be
+on the PATH for them.
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+TARGET_RATE = 16000
+TARGET_DBFS = -20.0
+MAX_GAIN_DB = 30.0
+FRAME_SECONDS = 0.02
+FFMPEG_RATE = 48000
+FFMPEG_CHANNELS = 2
+
+
+def decode(data, filename=None):
+    """Decode audio bytes into (float32 samples shaped (n, channels) in [-1, 1], sample rate)."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        return decode_wav(data)
+    return decode_ffmpeg(data, filename)
+
+
+def decode_wav(data):
+    with wave.open(io.BytesIO(data), 'rb') as wav_file:
+        channels = wav_file.getnchannels()
+        width = wav_file.getsampwidth()
+        rate = wav_file.getframerate()
+        raw = wav_file.readframes(wav_file.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+    elif width == 3:
+        # 24-bit: pad every sample to four bytes and read it as a 32-bit integer
+        padded = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = padded.view('<i4').ravel().astype(np.float32) / 2 ** 31
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2 ** 31
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width} bytes")
+    return samples.reshape(-1, channels), rate
+
+
+def decode_ffmpeg(data, filename=None):
+    """Decode compressed audio with ffmpeg into 48 kHz stereo float PCM."""
+    if shutil.which('ffmpeg') is None:
+        name = os.path.splitext(filename or "")[1] or "this format"
+        raise ValueError(f"Decoding {name} needs ffmpeg on the PATH; record or upload WAV instead")
+    # A fixed output layout means the rate and channels never have to be probed;
+    # downmixing and resampling to 16 kHz happen in NumPy like for WAV input
+    result = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-i', 'pipe:0', '-f', 'f32le', '-ac', str(FFMPEG_CHANNELS),
+         '-ar', str(FFMPEG_RATE), 'pipe:1'],
+        input=data, capture_output=True,
+    )
+    if result.returncode != 0:
+        raise ValueError(f"Could not decode audio: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype='<f4').reshape(-1, FFMPEG_CHANNELS), FFMPEG_RATE
+
+
+def to_mono(samples):
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def lowpass_kernel(cutoff, taps=101):
+    """Hann-windowed sinc low-pass filter; cutoff as a fraction of the sample rate."""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(taps)
+    return kernel / kernel.sum()
+
+
+def resample(samples, rate, target_rate=TARGET_RATE):
+    """Resample mono samples, low-pass filtering first when downsampling to avoid aliasing."""
+    if rate == target_rate or samples.size == 0:
+        return samples.astype(np.float32)
+    if target_rate < rate:
+        samples = np.convolve(samples, lowpass_kernel(0.5 * target_rate / rate * 0.9), mode='same')
+    duration = samples.size / rate
+    source_times = np.arange(samples.size) / rate
+    target_times = np.arange(int(duration * target_rate)) / target_rate
+    return np.interp(target_times, source_times, samples).astype(np.float32)
+
+
+def frame_levels(samples, rate, frame_seconds=FRAME_SECONDS):
+    """Level in dBFS of every frame, computed on a (frames, frame length) matrix."""
+    frame_length = max(1, int(rate * frame_seconds))
+    frame_count = samples.size // frame_length
+    if frame_count == 0:
+        return np.full(1, -np.inf), frame_length
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(rms), frame_length
+
+
+def trim_silence(samples, rate, relative_db=-35.0, floor_db=-55.0, padding=0.1):
+    """Cut leading and trailing frames below max(loudest frame + relative_db, floor_db), keeping some padding."""
+    levels, frame_length = frame_levels(samples, rate)
+    threshold = max(levels.max() + relative_db, floor_db)
+    voiced = np.flatnonzero(levels > threshold)
+    if voiced.size == 0:
+        return samples[:0]
+    pad = int(padding * rate)
+    start = max(0, voiced[0] * frame_length - pad)
+    end = min(samples.size, (voiced[-1] + 1) * frame_length + pad)
+    return samples[start:end]
+
+
+def normalize_loudness(samples, rate, target_dbfs=TARGET_DBFS, max_gain_db=MAX_GAIN_DB):
+    """Bring the voiced frames to target_dbfs RMS without clipping or over-amplifying noise."""
+    if samples.size == 0:
+        return samples
+    levels, frame_length = frame_levels(samples, rate)
+    # Only frames within 20 dB of the loudest count as speech for the loudness estimate
+    voiced = levels[levels > levels.max() - 20.0]
+    if voiced.size == 0 or not np.isfinite(voiced).any():
+        return samples
+    current_dbfs = 10 * np.log10(np.mean(10 ** (voiced[np.isfinite(voiced)] / 10)))
+    gain = 10 ** (min(target_dbfs - current_dbfs, max_gain_db) / 20)
+    peak = np.abs(samples).max()
+    if peak * gain > 0.99:
+        gain = 0.99 / peak
+    return (samples * gain).astype(np.float32)
+
+
+def preprocess(data, filename=None):
+    """Turn an uploaded recording into 16 kHz mono 16-bit PCM bytes ready for recognition."""
+    samples, rate = decode(data, filename)
+    samples = resample(to_mono(samples), rate)
+    samples = trim_silence(samples, TARGET_RATE)
+    samples = normalize_loudness(samples, TARGET_RATE)
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+class AudioPreprocessor:
+    """Bounded pool of worker processes that preprocess uploaded recordings."""
+
+    def __init__(self, workers=None, max_queue=64):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        # Uploads beyond max_queue wait here instead of piling onto the pool
+        self.slots = threading.BoundedSemaphore(max_queue)
+
+    def submit(self, data, filename=None, timeout=None):
+        """Queue a recording and return a Future for its PCM bytes."""
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError("Audio preprocessing queue is full")
+        try:
+            future = self.executor.submit(preprocess, data, filename)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,240 @@
+"""Generate analysis reports for many stored sessions at once.
+
+Every session in the conversation store (or just the ones active in the last
+few days) gets the same PDF report as the "Generate Report" button, built on a
+pool of worker processes so throughput scales with the cores. The analysis
+calls of all workers share one request budget: a rate limiter in shared memory
+spaces them out to at most --requests-per-minute, with bursts of --burst. Every
+attempt counts against the budget, retries of a rate-limited call included.
+Only a few reports per worker are queued at a time, so a large backlog of
+sessions is read from the store as the workers get to it.
+
+PDFs are written to the output directory as <session id>.pdf. A session whose
+PDF is newer than its last turn is skipped, so an interrupted run picks up
+where it stopped when started again. Each finished report is logged with its
+stage timings to timings.jsonl, and a summary is printed at the end:
+
+    python batch_reports.py --since-days 7 --output-dir reports/
+    python batch_reports.py --session 3f2a... --session 9c1e... --workers 4 --requests-per-minute 30
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from conversation_store import ConversationStore
+from report import HEADER_TEXT
+from stage_metrics import StageMetrics
+
+DEFAULT_REQUESTS_PER_MINUTE = 30
+# Reports queued per worker, enough to keep every worker busy without reading ahead the whole backlog
+REPORTS_IN_FLIGHT_PER_WORKER = 2
+
+
+class RateLimiter:
+    """Spaces calls out to `rate` per second across processes, allowing bursts of `burst` calls.
+
+    Keeps the time the next call is due in shared memory (the generic cell rate
+    algorithm), so any number of worker processes draw on one budget.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self.lock = multiprocessing.Lock()
+        self.due = multiprocessing.Value('d', 0.0, lock=False)
+
+    def acquire(self):
+        """Block until the budget allows another call, and return the seconds waited."""
+        with self.lock:
+            now = time.monotonic()
+            due = max(self.due.value, now)
+            wait = max(0.0, due - now - (self.burst - 1) * self.interval)
+            self.due.value = due + self.interval
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+# Set in each worker process by init_worker
+_limiter = None
+
+
+def init_worker(limiter):
+    global _limiter
+    from llm_gateway import get_gateway
+    from llm_resilience import RetryPolicy
+    from report_assets import preload_assets
+    _limiter = limiter
+    # Retries are made by complete_report_prompt, where each one waits for the shared budget
+    get_gateway(retry_policy=RetryPolicy(max_retries=0))
+    # Render the static report images once per worker rather than inside its first report
+    preload_assets()
+
+
+def complete_report_prompt(prompt):
+    """Get the report analysis from Llama 3 within the shared request budget."""
+    from llm_gateway import get_gateway
+    from llm_resilience import CANNED_RESPONSE, RetryPolicy, is_retryable
+    retry_policy = RetryPolicy()
+    attempt = 0
+    while True:
+        _limiter.acquire()
+        # Side-channel calls are never hedged, so each attempt is one upstream request within the budget
+        try:
+            response = get_gateway().side_complete(prompt, purpose="report")
+            break
+        except Exception as e:
+            if not is_retryable(e) or attempt >= retry_policy.max_retries:
+                raise
+            time.sleep(retry_policy.delay(attempt, e))
+            attempt += 1
+    if response == CANNED_RESPONSE:
+        # The circuit breaker's stand-in is no analysis, leave the session for the next run
+        raise RuntimeError("The LLM upstream is unavailable")
+    return response
+
+
+def build_report(session_id, conversation_history, weekly_progress, output_dir, header_text=HEADER_TEXT):
+    """Build one session's PDF in a worker process and return its timings."""
+    from report import generate_analysis_report
+
+    marks = []
+    start = time.perf_counter()
+    pdf_data, _ = generate_analysis_report(
+        conversation_history, complete_report_prompt, header_text=header_text, weekly_progress=weekly_progress,
+        progress=lambda stage: marks.append((stage, time.perf_counter())),
+    )
+    end = time.perf_counter()
+
+    path = os.path.join(output_dir, f"{session_id}.pdf")
+    # Write under a temporary name first, so an interrupted run never leaves a truncated PDF behind
+    with open(path + ".tmp", 'wb') as pdf_file:
+        pdf_file.write(pdf_data)
+    os.replace(path + ".tmp", path)
+
+    ends = [t for _, t in marks[1:]] + [end]
+    return {
+        "session_id": session_id,
+        "turns": len(conversation_history),
+        "seconds": end - start,
+        "stages": {stage: stop - t for (stage, t), stop in zip(marks, ends)},
+        "bytes": len(pdf_data),
+    }
+
+
+def is_up_to_date(path, session):
+    """Whether a session's PDF exists and is newer than its last turn."""
+    return os.path.exists(path) and os.path.getmtime(path) >= session["last_turn_at"]
+
+
+def run(store, output_dir, sessions, workers, requests_per_minute, burst=1, header_text=HEADER_TEXT, log=print):
+    """Build the reports of `sessions` (as listed by ConversationStore.sessions) and return a summary."""
+    os.makedirs(output_dir, exist_ok=True)
+    limiter = RateLimiter(requests_per_minute / 60.0, burst)
+    metrics = StageMetrics()
+    done, failed = [], []
+    start = time.perf_counter()
+    pending = iter(sessions)
+    futures = {}
+
+    def submit_next(pool):
+        # A session's history is read only when its report is about to be queued
+        session = next(pending, None)
+        if session is not None:
+            session_id = session["session_id"]
+            future = pool.submit(build_report, session_id, store.history(session_id),
+                                 store.weekly_progress(session_id), output_dir, header_text)
+            futures[future] = session_id
+
+    with open(os.path.join(output_dir, 'timings.jsonl'), 'a', encoding='utf-8') as timings_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(limiter,)) as pool:
+        try:
+            for _ in range(workers * REPORTS_IN_FLIGHT_PER_WORKER):
+                submit_next(pool)
+            while futures:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    session_id = futures.pop(future)
+                    submit_next(pool)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed.append({"session_id": session_id, "error": str(e)})
+                        log(f"  failed  {session_id}: {e}")
+                        continue
+                    done.append(result)
+                    metrics.observe("report_total", result["seconds"])
+                    for stage, seconds in result["stages"].items():
+                        metrics.observe(f"report_{stage}", seconds)
+                    timings_file.write(json.dumps(result) + "\n")
+                    timings_file.flush()
+                    log(f"  done    {session_id} ({result['turns']} turns, {result['seconds']:.1f}s) "
+                        f"[{len(done) + len(failed)}/{len(sessions)}]")
+        except KeyboardInterrupt:
+            # Finished PDFs are kept, the next run resumes with the rest
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    elapsed = time.perf_counter() - start
+    return {
+        "reports": len(done),
+        "failed": failed,
+        "seconds": elapsed,
+        "reports_per_minute": 60 * len(done) / elapsed if elapsed else 0.0,
+        "stages": metrics.snapshot(),
+    }
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Generate analysis reports for stored sessions.")
+    parser.add_argument('--db', default=os.getenv('CONVERSATION_DB', "conversations.db"), help="conversation store")
+    parser.add_argument('--output-dir', default="reports", help="directory the PDFs are written to")
+    parser.add_argument('--session', action='append', help="only this session (repeat for several)")
+    parser.add_argument('--since-days', type=float, help="only sessions active in the last N days")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="report worker processes")
+    parser.add_argument('--requests-per-minute', type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="upstream request budget shared by all workers")
+    parser.add_argument('--burst', type=int, default=1, help="requests allowed back to back within the budget")
+    parser.add_argument('--force', action='store_true', help="rebuild reports that are already up to date")
+    parser.add_argument('--header', default=HEADER_TEXT, help="header text of the reports")
+    args = parser.parse_args()
+
+    store = ConversationStore(args.db)
+    try:
+        since = time.time() - args.since_days * 86400 if args.since_days is not None else None
+        sessions = store.sessions(since)
+        if args.session:
+            sessions = [session for session in sessions if session["session_id"] in set(args.session)]
+        pending = [session for session in sessions if args.force
+                   or not is_up_to_date(os.path.join(args.output_dir, f"{session['session_id']}.pdf"), session)]
+        print(f"{len(sessions)} sessions, {len(sessions) - len(pending)} already up to date, "
+              f"{len(pending)} to build on {args.workers} workers")
+        if not pending:
+            return
+        try:
+            summary = run(store, args.output_dir, pending, args.workers, args.requests_per_minute, args.burst,
+                          args.header)
+        except KeyboardInterrupt:
+            raise SystemExit("Interrupted, run again to build the remaining reports")
+    finally:
+        store.close()
+
+    print(f"Built {summary['reports']} reports in {summary['seconds']:.1f}s "
+          f"({summary['reports_per_minute']:.1f}/min), {len(summary['failed'])} failed")
+    for stage, stats in summary["stages"].items():
+        print(f"  {stage:<20} n={stats['count']:<5} "
+              + "  ".join(f"{q}={stats[q] * 1000:.0f}ms" for q in ('p50', 'p95', 'p99')))
+    for failure in summary["failed"]:
+        print(f"  {failure['session_id']}: {failure['error']}")
+    if summary["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,595 @@
+"""Streamlit page of the voice chatbot, shared by app.py and Conversational AI.py.
+
+The entry scripts only differ in where their Groq API key comes from and the
+header of the report, which they pass to main(). Everything the page runs on
+(chat core or service client, TTS pool, speech recogniser, pronunciation
+scorer) is a resource built once per process and shared by its sessions.
+The text chatbot (app2.py) uses the same session state, chat core and
+transcript, without the speech stack.
+"""
+
+import streamlit as st
+import base64
+import functools
+import json
+import os
+import threading
+import uuid
+
+from chatbot import AUDIO, ChatCore, ChatServiceClient
+from conversation_store import ConversationStore
+from llm_gateway import get_gateway
+from tts_cache import TTSCache
+from tts_service import TTSService
+from report import generate_analysis_report
+from report_assets import preload_assets
+from report_jobs import ReportJobQueue, DONE, FAILED
+from stt_backends import LiveTranscription, make_backend
+from session_state import SessionSync, decode, encode, open_session_state
+from stage_metrics import (AUDIO_RENDER, PRONUNCIATION_SCORING, STT_CAPTURE, STT_PREPROCESS, STT_RECOGNITION,
+                           get_metrics, span, start_metrics_server)
+from transcript import PAGE_SIZE, TranscriptCache, bubble_html
+
+# Set by the entry script, through main() for the voice page; the text page turns `voice` off
+settings = {"api_key": None, "tts_driver": None, "voice": True}
+
+# Keys of st.session_state kept in the session-state backend (SESSION_STATE_URL), so a session survives
+# a restart and can be served by any worker; everything else is rebuilt or only lasts one run.
+# Recordings are stored as blobs of the session, the state only keeps their ids.
+PERSISTED_KEYS = ("visible_turns", "last_recording_id", "recording_ids")
+# A report job only outlives its worker when the chat service runs it
+SERVICE_PERSISTED_KEYS = ("report_job_id",)
+
+# Only the most recent recordings are scored for the report
+MAX_RECORDINGS = 50
+
+@st.cache_resource
+def get_session_state():
+    """One session-state backend per process, chosen with SESSION_STATE_URL."""
+    return open_session_state()
+
+def init_session_state():
+    """Set up this session's state on its first run, and restore its persisted keys."""
+    if 'session_id' not in st.session_state:
+        # The session id is kept in the URL, so a reload or a restart picks the conversation up again
+        st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+        st.query_params["session"] = st.session_state.session_id
+    if 'state_sync' not in st.session_state:
+        # Pick up where the session left off on whichever worker it was on before
+        keys = PERSISTED_KEYS + (SERVICE_PERSISTED_KEYS if os.getenv('CHAT_SERVICE_URL') else ())
+        st.session_state.state_sync = SessionSync(get_session_state(), st.session_state.session_id, keys)
+        st.session_state.update(st.session_state.state_sync.load())
+    if 'user_input' not in st.session_state:
+        st.session_state.user_input = ""
+    if 'listening' not in st.session_state:
+        st.session_state.listening = False
+    if 'turn_timings' not in st.session_state:
+        st.session_state.turn_timings = []
+    if 'transcript' not in st.session_state:
+        st.session_state.transcript = TranscriptCache()
+    if 'visible_turns' not in st.session_state:
+        st.session_state.visible_turns = PAGE_SIZE
+    if 'report_job_id' not in st.session_state:
+        st.session_state.report_job_id = None
+    if 'last_recording_id' not in st.session_state:
+        st.session_state.last_recording_id = None
+    if 'recording_ids' not in st.session_state:
+        st.session_state.recording_ids = []
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Serve the stage histograms on METRICS_PORT, once per process."""
+    port = os.getenv('METRICS_PORT')
+    return start_metrics_server(int(port)) if port else None
+
+@st.cache_resource
+def get_chat():
+    """The chat service at CHAT_SERVICE_URL, or a chat core in this process when it is not set.
+
+    Both are shared by every session of this process and answer the same calls.
+    """
+    url = os.getenv('CHAT_SERVICE_URL')
+    if url:
+        return ChatServiceClient(url)
+    # The Groq client lives in a gateway built once per process, not on every rerun
+    gateway = get_gateway(api_key=settings["api_key"])
+    if not settings["voice"]:
+        return ChatCore(ConversationStore(os.getenv('CONVERSATION_DB', "conversations.db")), gateway)
+    # Warm the static report images in the background, reports re-render them only if their source files change
+    threading.Thread(target=preload_assets, daemon=True).start()
+    return ChatCore(
+        ConversationStore(os.getenv('CONVERSATION_DB', "conversations.db")),
+        gateway,
+        tts_service=get_tts_service(),
+        tts_cache=get_tts_cache(),
+        report_jobs=ReportJobQueue(generate_analysis_report, max_workers=2, ttl=15 * 60),
+    )
+
+def conversation_history(limit=None):
+    """This session's conversation; only the last `limit` turns if given."""
+    return get_chat().history(st.session_state.session_id, limit)
+
+def add_turn(role, content, **stats):
+    """Append a turn to this session's conversation."""
+    get_chat().add_turn(st.session_state.session_id, role, content, **stats)
+
+def stream_response(user_input, max_tokens=None):
+    """Stream a response from Llama 3 chunk by chunk and maintain conversation context."""
+    # Voice turns carry their recognition confidence and practised phonemes
+    return get_chat().stream_reply(st.session_state.session_id, user_input, st.session_state.pop('turn_signals', {}),
+                                   on_done=st.session_state.turn_timings.append, max_tokens=max_tokens)
+
+def generate_response(user_input):
+    """Generate a response using Llama 3 and maintain conversation context."""
+    return "".join(stream_response(user_input))
+
+def render_streamed_reply(placeholder, user_input, chunks):
+    """Render the reply in the chat area as it streams in and return the full text."""
+    user_html = bubble_html("user", user_input)
+    response_text = ""
+    for chunk in chunks:
+        response_text += chunk
+        placeholder.markdown(
+            f'<div class="chat-container">{user_html}{bubble_html("assistant", response_text)}</div>',
+            unsafe_allow_html=True,
+        )
+    return response_text
+
+def save_session_state():
+    """Write back the persisted keys this run changed, taking over the ones another worker changed meanwhile."""
+    st.session_state.update(st.session_state.state_sync.save(st.session_state))
+
+def show_earlier_turns():
+    st.session_state.visible_turns += PAGE_SIZE
+    # Only the transcript fragment reruns, so the end of main() is not reached
+    save_session_state()
+
+@st.fragment
+def render_transcript():
+    """Show the latest turns of the conversation, earlier ones a page at a time on request.
+
+    Loading earlier messages only reruns this fragment, not the whole page.
+    """
+    chat = get_chat()
+    session_id = st.session_state.session_id
+    hidden = chat.count(session_id) - st.session_state.visible_turns
+    if hidden > 0:
+        st.button(f"Load earlier messages ({hidden} more)", key="load_earlier", on_click=show_earlier_turns)
+    turns = chat.turns(session_id, limit=st.session_state.visible_turns)
+    st.markdown(st.session_state.transcript.html(turns), unsafe_allow_html=True)
+
+# Plays audio segments one after another. It is installed in the page rather than in the component's
+# frame, so it keeps going when Streamlit removes the frame, and one queue serves every segment of a reply.
+AUDIO_QUEUE_JS = """
+<script>
+(function () {
+  const page = window.parent;
+  if (!page.chatbotAudio) {
+    const script = page.document.createElement("script");
+    script.textContent = `window.chatbotAudio = {
+      reply: null, queue: [], current: null,
+      enqueue(reply, url) {
+        if (reply !== this.reply) {
+          // A new reply cuts off what is left of the previous one
+          this.reply = reply;
+          this.queue = [];
+          if (this.current) { this.current.pause(); this.current = null; }
+        }
+        this.queue.push(url);
+        this.next();
+      },
+      next() {
+        if (this.current || !this.queue.length) return;
+        const audio = this.current = new Audio(this.queue.shift());
+        audio.onended = audio.onerror = () => {
+          if (this.current === audio) { this.current = null; this.next(); }
+        };
+        audio.play().catch(audio.onerror);
+      },
+    };`;
+    page.document.head.appendChild(script);
+  }
+  page.chatbotAudio.enqueue(REPLY_ID, AUDIO_URL);
+})();
+</script>
+"""
+
+def queue_audio(reply_id, audio_data):
+    """Queue one audio segment of a reply to play after the ones before it."""
+    import streamlit.components.v1 as components
+    mime = "audio/wav" if audio_data[:4] == b"RIFF" else "audio/mpeg"
+    url = f"data:{mime};base64,{base64.b64encode(audio_data).decode('ascii')}"
+    components.html(AUDIO_QUEUE_JS.replace("REPLY_ID", json.dumps(reply_id)).replace("AUDIO_URL", json.dumps(url)),
+                    height=0)
+
+def speak_streamed_reply(placeholder, audio_area, user_input):
+    """Stream the reply into the chat area while speaking it sentence by sentence.
+
+    Each sentence is synthesised as soon as it is complete, so the first audio
+    segment is ready long before the whole reply has been generated. The
+    segments play back to back in sentence order.
+    """
+    events = get_chat().speak_reply(st.session_state.session_id, user_input, st.session_state.pop('turn_signals', {}),
+                                    on_done=st.session_state.turn_timings.append)
+    reply_id = uuid.uuid4().hex
+
+    def text_chunks():
+        for kind, data in events:
+            if kind != AUDIO:
+                yield data
+                continue
+            with span(AUDIO_RENDER), audio_area:
+                queue_audio(reply_id, data)
+
+    return render_streamed_reply(placeholder, user_input, text_chunks())
+
+@st.cache_resource
+def get_tts_cache():
+    """One synthesised-audio cache shared by every session of this process."""
+    return TTSCache()
+
+@st.cache_resource
+def get_tts_service():
+    """One pool of TTS worker processes shared by every session of this process."""
+    return TTSService(driver=settings["tts_driver"], voice_index=1, rate=125, volume=1.0)
+
+@st.cache_resource
+def get_stt_backend():
+    """One speech recognizer per process, chosen with STT_BACKEND (offline models load once)."""
+    return make_backend()
+
+def recognize_speech(source, status_placeholder):
+    """Listen to the microphone until the user stops talking.
+
+    Returns the transcript, the recogniser's confidence and the recording as
+    (PCM bytes, sample rate).
+
+    Recognition runs while the user is still speaking, so only the last words
+    are left to recognise when capture ends. Streaming backends also show
+    partial transcripts as they go.
+    """
+    # NumPy is only loaded once voice mode is used
+    from vad import calibrated_vad, capture_speech
+
+    # The noise calibration is reused for this microphone until it goes stale
+    vad = calibrated_vad(source)
+    transcription = LiveTranscription(
+        get_stt_backend(), source.SAMPLE_RATE, source.SAMPLE_WIDTH,
+        on_partial=lambda text: status_placeholder.text(f"Listening... {text}"),
+    )
+    with span(STT_CAPTURE):
+        pcm = capture_speech(source, vad, on_frame=transcription.feed_frame, on_segment=transcription.feed_segment,
+                       trailing_silence=float(os.getenv('VAD_TRAILING_SILENCE', 0.6)))
+    with span(STT_RECOGNITION):
+        text = transcription.finish()
+    return text, transcription.confidence, (pcm, source.SAMPLE_RATE)
+
+@st.cache_resource
+def get_audio_preprocessor():
+    """One pool of audio preprocessing processes shared by every session of this process."""
+    from audio_preprocess import AudioPreprocessor
+    return AudioPreprocessor()
+
+def record_in_browser():
+    """Return a new voice recording made in the browser, or None when there is none."""
+    audio_input = getattr(st, 'audio_input', None) or getattr(st, 'experimental_audio_input', None)
+    if audio_input is not None:
+        recording = audio_input("Record your answer", key="voice_recording")
+    else:
+        # Streamlit releases without a recorder widget take a recorded file instead
+        recording = st.file_uploader(
+            "Upload a voice recording", type=["wav", "webm", "ogg", "mp3", "m4a", "flac"], key="voice_recording"
+        )
+    # The widget keeps returning the last recording on every rerun, only answer it once
+    if recording is None or recording.file_id == st.session_state.last_recording_id:
+        return None
+    st.session_state.last_recording_id = recording.file_id
+    return recording
+
+def transcribe_recording(recording):
+    """Preprocess a browser recording off the script thread.
+
+    Returns the transcript, the recogniser's confidence and the preprocessed
+    recording as (PCM bytes, sample rate).
+    """
+    import speech_recognition as sr
+    from audio_preprocess import TARGET_RATE
+    future = get_audio_preprocessor().submit(recording.getvalue(), recording.name)
+    with span(STT_PREPROCESS):
+        pcm = future.result()
+    if not pcm:
+        # Nothing but silence
+        raise sr.UnknownValueError()
+    with span(STT_RECOGNITION):
+        text, confidence = get_stt_backend().transcribe(sr.AudioData(pcm, TARGET_RATE, 2))
+    return text, confidence, (pcm, TARGET_RATE)
+
+@st.cache_resource
+def get_pronunciation_scorer():
+    """The scorer over the memory-mapped reference templates, or None when no store is built."""
+    path = os.getenv('PRONUNCIATION_TEMPLATES', "pronunciation_templates")
+    if not os.path.exists(os.path.join(path, 'index.json')):
+        return None
+    from pronunciation import PronunciationScorer, TemplateStore
+    return PronunciationScorer(TemplateStore(path))
+
+def show_pronunciation_feedback(recording):
+    """Score the phonemes the bot just asked for and keep the recording for the report.
+
+    The practised phonemes and their mean score go into the turn signals of the user's turn.
+    """
+    from pronunciation import asked_phonemes
+    # Phonemes the bot asked for since the user's previous turn (its reply and the encouragement)
+    asked = []
+    for msg in reversed(conversation_history(limit=4)):
+        if msg['role'] == 'user':
+            break
+        asked = asked_phonemes(msg['content']) + asked
+    asked = list(dict.fromkeys(asked))
+    if asked:
+        st.session_state.turn_signals["phonemes"] = asked
+
+    scorer = get_pronunciation_scorer()
+    pcm, rate = recording
+    if scorer is None or not pcm:
+        return
+    keep_recording(recording)
+    if not asked:
+        return
+    with span(PRONUNCIATION_SCORING):
+        scores = scorer.score(pcm, rate, asked)
+    if scores:
+        st.session_state.turn_signals["pronunciation"] = sum(scores.values()) / len(scores)
+        st.caption("Pronunciation: " + ", ".join(f"'{phoneme}' {score:.0f}/100" for phoneme, score in scores.items()))
+
+def keep_recording(recording):
+    """Store a (PCM bytes, sample rate) recording once as a blob of the session, for the report."""
+    pcm, rate = recording
+    recording_id = uuid.uuid4().hex
+    if st.session_state.state_sync.put_blob(f"recording:{recording_id}", encode({"pcm": pcm, "rate": rate})):
+        st.session_state.recording_ids = st.session_state.recording_ids[-(MAX_RECORDINGS - 1):] + [recording_id]
+
+def score_recordings(scorer, state_sync, recording_ids):
+    """Load the stored recordings and batch-score them; expired ones are left out."""
+    recordings = []
+    for recording_id in recording_ids:
+        data = state_sync.get_blob(f"recording:{recording_id}")
+        if data is not None:
+            recording = decode(data)
+            recordings.append((recording["pcm"], recording["rate"]))
+    return scorer.score_batch(recordings)
+
+def score_session_recordings():
+    """A callable that batch-scores this session's recordings in the report job, or None."""
+    scorer = get_pronunciation_scorer()
+    if scorer is None or not st.session_state.recording_ids:
+        return None
+    return functools.partial(score_recordings, scorer, st.session_state.state_sync,
+                             list(st.session_state.recording_ids))
+
+@st.fragment(run_every=2)
+def show_report_status():
+    """Poll the background report job and offer the PDF once it is built."""
+    job = get_chat().report_job(st.session_state.report_job_id)
+    if job is None:
+        st.warning("The report has expired, please generate it again.")
+    elif job.status == DONE:
+        st.success("Report generated successfully!")
+        st.download_button(
+            label="Download Analysis Report",
+            data=job.pdf_data,
+            file_name=job.pdf_filename,
+            mime="application/pdf",
+        )
+    elif job.status == FAILED:
+        st.error("Failed to generate report.")
+    else:
+        st.info(f"Generating report... ({job.stage or 'queued'})")
+
+def main(header_text, api_key=None, tts_driver=None):
+    """Run the page once; `header_text` heads the PDF report.
+
+    `api_key` is the Groq API key and `tts_driver` the pyttsx3 driver (its
+    default for None), both used when the chat core is built in this process.
+    """
+    settings.update(api_key=api_key, tts_driver=tts_driver)
+    # Stage latencies are also appended to METRICS_JSONL when it is set
+    get_metrics(jsonl_path=os.getenv('METRICS_JSONL'))
+    start_metrics_endpoint()
+    init_session_state()
+
+    st.markdown("""
+        <style>
+        body {
+            background-color: #fff;
+            font-family: Arial, sans-serif;
+        }
+        .centered-title {
+            text-align: center;
+            color: #333;
+        }
+
+        .chat-bubble {
+            padding: 15px;
+            border-radius: 20px;
+            max-width: 70%;
+            margin-bottom: 15px;
+            font-size: 1.1rem;
+            line-height: 1.4;
+        }
+        .user-bubble {
+            background-color: #2D8CFF;
+            text-align: left;
+            color: white;
+            box-shadow: 0px 2px 10px rgba(0, 0, 0, 0.15);
+        }
+        .bot-bubble {
+            background-color: #f3e5ab;
+            text-align: right;
+            color: #000;
+            box-shadow: 0px 2px 10px rgba(0, 0, 0, 0.15);
+        }
+        .chat-container {
+            display: flex;
+            flex-direction: column;
+            align-items: flex-start;
+        }
+        .chat-container .bot-bubble {
+            align-self: flex-end;
+        }
+
+        .stButton>button {
+            background-color: #89D85D;
+            color: black;
+            font-weight: bold;
+            border: none;
+            padding: 12px 28px;
+            text-align: center;
+            font-size: 18px;
+            margin: 6px 2px;
+            cursor: pointer;
+            border-radius: 12px;
+            transition: all 0.3s ease;
+            outline: none;
+        }
+
+        .stButton>button:hover {
+            background-color: #013220;
+            transform: scale(1.05);
+            color: white;
+        }
+
+        .stButton>button:focus,
+        .stButton>button:active {
+            background-color: #89D85D;
+            color: black;
+            outline: none;
+            box-shadow: none;
+        }
+
+        .stAudio {
+            margin-top: 20px;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+
+    st.markdown('<div class="main-chat-area">', unsafe_allow_html=True)  # Open main chat area with white background
+
+    st.markdown('<h1 class="centered-title">🤖 Pronunciation & Confidence-Boosting Chatbot 🗣️</h1>', unsafe_allow_html=True)
+
+    if get_chat().count(st.session_state.session_id) == 0:
+        introduction = (
+            "Hello! I'm your chatbot, here to help you improve your pronunciation and boost your confidence while you learn. "
+            "We will practice some sounds and have fun conversations together. Let’s start! How are you feeling today?"
+        )
+        add_turn("assistant", introduction)
+        st.write(introduction)
+
+    st.subheader("Conversation")
+    render_transcript()
+
+    # Replies are streamed here as they are generated
+    stream_placeholder = st.empty()
+
+    st.subheader("Speak to the chatbot")
+
+    status_placeholder = st.empty()
+
+    # Remote users record in their browser, the server microphone is only for a kiosk setup
+    recording = None
+    if os.getenv('VOICE_INPUT', "browser") == "browser":
+        recording = record_in_browser()
+    elif st.button("Start Listening"):
+        st.session_state.listening = True
+        status_placeholder.text("Listening...")
+        # The speech stack is only loaded once voice mode is used
+        import speech_recognition as sr
+        with sr.Microphone() as source:
+            try:
+                st.session_state.user_input, confidence, captured = recognize_speech(source, status_placeholder)
+                st.write(f"You said: {st.session_state.user_input}")
+                st.session_state.turn_signals = {"confidence": confidence}
+                show_pronunciation_feedback(captured)
+                
+                if st.session_state.user_input:
+                    # Ask targeted questions to practice phonemes and build confidence
+                    question_prompts = [
+                        "Great! Now, let's practice saying some sounds. Can you say 'p' and 'b' for me?",
+                        "Can you try saying 's' and 'sh'? These are tricky but you're doing amazing!",
+                        "How about the sound 'k'? That's the sound in 'cat.' Can you say it?",
+                        "Can you tell me about your favorite hobby? Don’t worry, just relax and share anything!"
+                    ]
+
+                    user_input = st.session_state.user_input
+                    response = speak_streamed_reply(stream_placeholder, st.container(), user_input)
+                    st.session_state.user_input = ""  # Clear input after sending
+
+                    # Continue boosting confidence
+                    encouragement = "You're doing so well! Keep going, I believe in you!"
+                    add_turn("assistant", encouragement)
+                    
+                    st.session_state.listening = False
+                    status_placeholder.empty()
+
+            except sr.UnknownValueError:
+                st.write("Sorry, I could not understand the audio.")
+                st.session_state.listening = False
+                status_placeholder.empty()
+
+            except sr.UnknownValueError:
+                st.write("Sorry, I could not understand the audio.")
+                st.session_state.listening = False
+                status_placeholder.empty()
+            except sr.RequestError as e:
+                st.write(f"Could not request results; {e}")
+                st.session_state.listening = False
+                status_placeholder.empty()
+
+    if recording is not None:
+        import speech_recognition as sr
+        try:
+            st.session_state.user_input, confidence, preprocessed = transcribe_recording(recording)
+            st.write(f"You said: {st.session_state.user_input}")
+            st.session_state.turn_signals = {"confidence": confidence}
+            show_pronunciation_feedback(preprocessed)
+
+            user_input = st.session_state.user_input
+            response = speak_streamed_reply(stream_placeholder, st.container(), user_input)
+            st.session_state.user_input = ""  # Clear input after sending
+
+            # Continue boosting confidence
+            encouragement = "You're doing so well! Keep going, I believe in you!"
+            add_turn("assistant", encouragement)
+        except sr.UnknownValueError:
+            st.write("Sorry, I could not understand the audio.")
+        except sr.RequestError as e:
+            st.write(f"Could not request results; {e}")
+        except ValueError as e:
+            st.write(f"Could not read the recording; {e}")
+
+    st.subheader("Type to the chatbot")
+
+    # Input box for user to type their input
+    st.session_state.user_input = st.text_input("You: ", st.session_state.user_input, key="user_input_box")
+    
+    if st.session_state.user_input:
+        user_input = st.session_state.user_input
+        response = speak_streamed_reply(stream_placeholder, st.container(), user_input)
+        st.session_state.user_input = ""  # Clear input after sending
+
+    st.markdown('<br><hr><br>', unsafe_allow_html=True)
+
+    if st.button("Generate Report"):
+        # Built in the background, the same conversation snapshot reuses its existing job
+        st.session_state.report_job_id = get_chat().submit_report(
+            st.session_state.session_id,
+            header_text=header_text,
+            score_pronunciation=score_session_recordings(),
+        )
+
+    if st.session_state.report_job_id:
+        show_report_status()
+
+    st.markdown('</div>', unsafe_allow_html=True)  # Close main chat area
+
+    save_session_state()
@@ -0,0 +1,8 @@
+"""The chatbot's conversation, speech and report core, its chat service and a client of that service.
+
+Importing the package stays cheap: the service's web stack is only imported
+when an app is created.
+"""
+
+from chatbot.client import ChatServiceClient, RemoteReportJob
+from chatbot.core import AUDIO, CHAT_PARAMS, TOKEN, ChatCore
@@ -0,0 +1,134 @@
+"""Client of the chat service, with the same interface as ChatCore.
+
+The Streamlit scripts use this when CHAT_SERVICE_URL is set, so they keep
+nothing but widgets and their session's recordings: turns, replies, speech
+and reports all come from the service. Replies stream over one WebSocket per
+turn and everything else goes over pooled HTTP connections.
+
+Needs `pip install websockets` (HTTP goes through httpx, which Groq already needs).
+"""
+
+import collections
+import json
+import threading
+
+from chatbot.core import AUDIO, TOKEN
+from report import HEADER_TEXT
+from report_jobs import DONE
+
+
+class RemoteReportJob:
+    """State of a report job on the service, as returned by ChatServiceClient.report_job."""
+
+    def __init__(self, state, pdf_data=None):
+        self.id = state["job_id"]
+        self.status = state["status"]
+        self.stage = state["stage"]
+        self.error = state["error"]
+        self.pdf_filename = state["pdf_filename"]
+        self.pdf_data = pdf_data
+
+
+class ChatServiceClient:
+    """Talks to a chat service at `url` (e.g. http://127.0.0.1:8000), shared by every session of a process."""
+
+    def __init__(self, url, timeout=60.0, max_pdfs=64):
+        import httpx
+
+        self.url = url.rstrip('/')
+        self.ws_url = "ws" + self.url[len("http"):]
+        self.timeout = timeout
+        self.http = httpx.Client(base_url=self.url, timeout=timeout)
+        # Finished PDFs are fetched once, not on every poll of the job
+        self.pdfs = collections.OrderedDict()
+        self.max_pdfs = max_pdfs
+        self.lock = threading.Lock()
+
+    def _get(self, path, **params):
+        response = self.http.get(path, params={k: v for k, v in params.items() if v is not None})
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, path, body):
+        response = self.http.post(path, json=body)
+        response.raise_for_status()
+        return response.json()
+
+    def history(self, session_id, limit=None, since_seq=0):
+        return self._get(f"/sessions/{session_id}/history", limit=limit, since_seq=since_seq or None)
+
+    def turns(self, session_id, limit=None, since_seq=0):
+        return self._get(f"/sessions/{session_id}/turns", limit=limit, since_seq=since_seq or None)
+
+    def count(self, session_id):
+        return self._get(f"/sessions/{session_id}")["turns"]
+
+    def add_turn(self, session_id, role, content, **stats):
+        self._post(f"/sessions/{session_id}/turns", dict(stats, role=role, content=content))
+
+    def speak_reply(self, session_id, user_text, signals=None, on_done=None, max_tokens=None, speak=True):
+        """Yield (TOKEN, text) and (AUDIO, bytes) events of the reply as the service sends them.
+
+        Closing the generator early closes the WebSocket, which cancels the reply on the service.
+        """
+        from websockets.sync.client import connect
+
+        message = {"text": user_text, "signals": signals or {}, "speak": speak, "max_tokens": max_tokens}
+        with connect(f"{self.ws_url}/sessions/{session_id}/chat", open_timeout=self.timeout,
+                     max_size=None) as websocket:
+            websocket.send(json.dumps(message))
+            while True:
+                frame = websocket.recv(timeout=self.timeout)
+                if isinstance(frame, bytes):
+                    # Audio segments are the only binary frames
+                    yield AUDIO, frame
+                    continue
+                event = json.loads(frame)
+                if event["type"] == TOKEN:
+                    yield TOKEN, event["text"]
+                elif event["type"] == "done":
+                    if on_done is not None:
+                        on_done(event["timing"])
+                    return
+                else:
+                    raise RuntimeError(event.get("message", "The chat service failed"))
+
+    def stream_reply(self, session_id, user_text, signals=None, on_done=None, max_tokens=None):
+        for kind, data in self.speak_reply(session_id, user_text, signals, on_done, max_tokens, speak=False):
+            if kind == TOKEN:
+                yield data
+
+    def submit_report(self, session_id, header_text=HEADER_TEXT, score_pronunciation=None):
+        """Queue the analysis report of a session on the service and return its job id.
+
+        The recordings stay in this process, so `score_pronunciation()` runs
+        here and only its scores are sent along.
+        """
+        body = {"header_text": header_text}
+        if score_pronunciation is not None:
+            body["pronunciation_scores"] = score_pronunciation()
+        return self._post(f"/sessions/{session_id}/reports", body)["job_id"]
+
+    def report_job(self, job_id):
+        """The report job for an id, its PDF included once it is built, or None if it has expired."""
+        response = self.http.get(f"/reports/{job_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        state = response.json()
+        pdf_data = None
+        if state["status"] == DONE:
+            with self.lock:
+                pdf_data = self.pdfs.get(job_id)
+            if pdf_data is None:
+                pdf = self.http.get(f"/reports/{job_id}/pdf")
+                pdf.raise_for_status()
+                pdf_data = pdf.content
+                with self.lock:
+                    self.pdfs[job_id] = pdf_data
+                    while len(self.pdfs) > self.max_pdfs:
+                        self.pdfs.popitem(last=False)
+        return RemoteReportJob(state, pdf_data)
+
+    def close(self):
+        self.http.close()
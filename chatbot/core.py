@@ -0,0 +1,263 @@
+"""Conversation, speech and report logic of the chatbot.
+
+Every turn goes through here, whether it comes from a Streamlit script running
+the core in its own process or from a client of the chat service
+(chatbot/service.py). The core is built once per process and serves all of its
+sessions: turns live in the conversation store, completions go through the
+process's LLM gateway, speech through the TTS worker pool and its cache, and
+reports through the background report queue.
+
+Replies are streamed as chunks of text, or as events when they are spoken:
+(TOKEN, text) as the reply is generated and (AUDIO, bytes) for each sentence's
+audio, in order, as soon as it is synthesised. Both have a blocking version for
+script threads and an async one for the service's event loop.
+"""
+
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+from context_window import ContextWindow, estimate_tokens
+from report import HEADER_TEXT
+from speech_pipeline import SentenceSplitter, SpeechPipeline
+from stage_metrics import LLM_TOTAL, LLM_TTFT, observe
+from tts_cache import cache_key
+
+TOKEN = "token"
+AUDIO = "audio"
+
+CHAT_PARAMS = {
+    "model": "llama3-8b-8192",
+    "temperature": 0.7,
+    "max_tokens": 200,
+    "top_p": 0.9,
+    "stop": None,
+}
+
+# Seconds a spoken reply waits for room in the TTS queue before it skips a sentence
+TTS_QUEUE_TIMEOUT = 30.0
+
+
+class ChatCore:
+    """The sessions of one process: their turns, replies, speech and reports.
+
+    Each session's context window is kept for the `max_sessions` most recently
+    active sessions; an evicted one is rebuilt from the stored history. A
+    window has its own lock, so two turns of one session (a double submit, or
+    two service requests) build their prompts one after the other.
+    """
+
+    def __init__(self, store, gateway, tts_service=None, tts_cache=None, report_jobs=None, chat_params=None,
+                 max_tokens=3000, keep_recent=8, max_sessions=1024):
+        self.store = store
+        self.gateway = gateway
+        self.tts_service = tts_service
+        self.tts_cache = tts_cache
+        self.report_jobs = report_jobs
+        self.chat_params = dict(CHAT_PARAMS, **(chat_params or {}))
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.max_sessions = max_sessions
+        self.contexts = collections.OrderedDict()
+        self.lock = threading.Lock()
+        # Async replies wait for room in the TTS queue here, without holding a thread
+        self.tts_slots = asyncio.Semaphore(tts_service.max_queue) if tts_service is not None else None
+
+    def context_window(self, session_id):
+        """A session's context window and the lock that guards it."""
+        with self.lock:
+            entry = self.contexts.pop(session_id, None)
+            if entry is None:
+                entry = (ContextWindow(max_tokens=self.max_tokens, keep_recent=self.keep_recent), threading.Lock())
+            self.contexts[session_id] = entry
+            while len(self.contexts) > self.max_sessions:
+                self.contexts.popitem(last=False)
+            return entry
+
+    def history(self, session_id, limit=None, since_seq=0):
+        """A session's conversation as chat messages; only the last `limit` turns if given."""
+        return self.store.history(session_id, limit, since_seq)
+
+    def turns(self, session_id, limit=None, since_seq=0):
+        return self.store.turns(session_id, limit, since_seq)
+
+    def count(self, session_id):
+        return self.store.count(session_id)
+
+    def add_turn(self, session_id, role, content, **stats):
+        """Append a turn to a session."""
+        self.store.append(session_id, role, content, tokens=estimate_tokens(content), **stats)
+
+    def _begin_reply(self, session_id, user_text, signals):
+        """Store the user's turn and return the messages to send and their token count."""
+        # Voice turns carry their recognition confidence and practised phonemes
+        self.add_turn(session_id, "user", user_text, **(signals or {}))
+        # Only send a token-budgeted window of the conversation history, reading just the turns it has not folded
+        context_window, lock = self.context_window(session_id)
+        with lock:
+            start = context_window.resume_from()
+            messages = context_window.build(self.history(session_id, since_seq=start), start)
+            return messages, context_window.last_prompt_tokens
+
+    def _finish_reply(self, session_id, response_text, prompt_tokens, start_time, first_token_time):
+        """Record the reply's timing and store it once it has fully arrived."""
+        end_time = time.perf_counter()
+        timing = {
+            "time_to_first_token": (first_token_time or end_time) - start_time,
+            "total_time": end_time - start_time,
+        }
+        observe(LLM_TTFT, timing["time_to_first_token"], first_token_time is not None)
+        observe(LLM_TOTAL, timing["total_time"])
+        self.add_turn(session_id, "assistant", response_text, latency=timing["total_time"],
+                      ttft=timing["time_to_first_token"], prompt_tokens=prompt_tokens)
+        return timing
+
+    def _params(self, max_tokens):
+        # A client may ask for shorter replies, never for longer ones
+        if max_tokens is None:
+            return self.chat_params
+        return dict(self.chat_params, max_tokens=min(max_tokens, self.chat_params["max_tokens"]))
+
+    def stream_reply(self, session_id, user_text, signals=None, on_done=None, max_tokens=None):
+        """Yield the reply to the user's text chunk by chunk.
+
+        `signals` are stored with the user's turn, and `on_done(timing)` is
+        called once the reply is complete and stored.
+        """
+        messages, prompt_tokens = self._begin_reply(session_id, user_text, signals)
+        start_time = time.perf_counter()
+        first_token_time = None
+        response_text = ""
+        for content in self.gateway.stream_chat(messages, session_id=session_id, **self._params(max_tokens)):
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            response_text += content
+            yield content
+        timing = self._finish_reply(session_id, response_text, prompt_tokens, start_time, first_token_time)
+        if on_done is not None:
+            on_done(timing)
+
+    async def astream_reply(self, session_id, user_text, signals=None, on_done=None, max_tokens=None):
+        """Async version of stream_reply() for the service's event loop."""
+        # Reading the history may wait for the store, keep that off the loop
+        messages, prompt_tokens = await asyncio.to_thread(self._begin_reply, session_id, user_text, signals)
+        start_time = time.perf_counter()
+        first_token_time = None
+        response_text = ""
+        async for content in self.gateway.astream_chat(messages, session_id=session_id, **self._params(max_tokens)):
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            response_text += content
+            yield content
+        timing = await asyncio.to_thread(self._finish_reply, session_id, response_text, prompt_tokens, start_time,
+                                         first_token_time)
+        if on_done is not None:
+            on_done(timing)
+
+    def synthesize(self, text, timeout=None):
+        """Return a Future for the spoken text, served from the cache when possible.
+
+        Waits up to `timeout` seconds (forever if None) for room in the TTS queue.
+        """
+        if self.tts_service is None:
+            raise RuntimeError("This chat core has no text-to-speech")
+        # Repeated phrases (intro, encouragement, phoneme prompts) are served from the cache
+        key = cache_key(text, self.tts_service.voice_id, self.tts_service.rate, self.tts_service.volume)
+        audio_data = self.tts_cache.get(key) if self.tts_cache is not None else None
+        if audio_data is not None:
+            future = Future()
+            future.set_result(audio_data)
+            return future
+
+        def store(future):
+            if future.exception() is None:
+                self.tts_cache.put(key, future.result())
+
+        future = self.tts_service.submit(text, timeout=timeout)
+        if self.tts_cache is not None:
+            future.add_done_callback(store)
+        return future
+
+    def speak_reply(self, session_id, user_text, signals=None, on_done=None, max_tokens=None):
+        """Yield (TOKEN, text) events as the reply streams in and (AUDIO, bytes) for each spoken sentence.
+
+        Each sentence is synthesised as soon as it is complete, so the first
+        audio segment is ready long before the whole reply has been generated.
+        """
+        # Sentences are submitted to the worker pool and synthesise concurrently
+        pipeline = SpeechPipeline(lambda index, sentence: self.synthesize(sentence))
+        for chunk in pipeline.feed(self.stream_reply(session_id, user_text, signals, on_done, max_tokens)):
+            yield TOKEN, chunk
+            for audio_data in pipeline.ready_segments():
+                yield AUDIO, audio_data
+        for audio_data in pipeline.remaining_segments():
+            yield AUDIO, audio_data
+
+    async def aspeak_reply(self, session_id, user_text, signals=None, on_done=None, max_tokens=None):
+        """Async version of speak_reply() for the service's event loop."""
+        if self.tts_slots is None:
+            raise RuntimeError("This chat core has no text-to-speech")
+        splitter = SentenceSplitter()
+        pending = collections.deque()
+
+        async def audio(wait):
+            # Segments are handed out in sentence order, a failed one is skipped
+            while pending and (wait or pending[0].done()):
+                future = pending.popleft()
+                try:
+                    yield await future
+                except Exception as e:
+                    print(f"Error synthesising sentence: {e}")
+
+        async def synthesized(sentence):
+            # A busy TTS queue delays a sentence rather than dropping it, only a
+            # queue stuck for TTS_QUEUE_TIMEOUT gives up on it
+            await asyncio.wait_for(self.tts_slots.acquire(), TTS_QUEUE_TIMEOUT)
+            try:
+                # The cache reads from disk, keep it off the loop
+                future = await asyncio.to_thread(self.synthesize, sentence, TTS_QUEUE_TIMEOUT)
+                return await asyncio.wrap_future(future)
+            finally:
+                self.tts_slots.release()
+
+        def submit(sentences):
+            pending.extend(asyncio.ensure_future(synthesized(sentence)) for sentence in sentences)
+
+        try:
+            async for chunk in self.astream_reply(session_id, user_text, signals, on_done, max_tokens):
+                yield TOKEN, chunk
+                submit(splitter.push(chunk))
+                async for audio_data in audio(wait=False):
+                    yield AUDIO, audio_data
+            submit(splitter.flush())
+            async for audio_data in audio(wait=True):
+                yield AUDIO, audio_data
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def complete_report_prompt(self, prompt):
+        """Get the report analysis from Llama 3 on the side channel, which never touches the chat history."""
+        # Regenerating the report for an unchanged conversation is served from the cache
+        return self.gateway.side_complete(prompt, purpose="report")
+
+    def submit_report(self, session_id, header_text=HEADER_TEXT, score_pronunciation=None):
+        """Queue the analysis report of a session and return its job id.
+
+        `score_pronunciation()`, when given, batch-scores the session's recordings in the report job.
+        """
+        # Built in the background, the same snapshot of this session reuses its existing job
+        return self.report_jobs.submit(
+            self.history(session_id),
+            session_id=session_id,
+            complete=self.complete_report_prompt,
+            header_text=header_text,
+            score_pronunciation=score_pronunciation,
+            weekly_progress=self.store.weekly_progress(session_id),
+        )
+
+    def report_job(self, job_id):
+        """The report job for an id, or None if it is unknown or has expired."""
+        return self.report_jobs.get(job_id)
@@ -0,0 +1,259 @@
+"""Headless chat service: the chatbot core behind an async ASGI app.
+
+One process serves every session on one event loop, without the per-rerun
+overhead of a Streamlit script: a turn costs a WebSocket message and the
+tokens streamed back, not a re-execution of the page. The Streamlit scripts
+become thin clients of it when CHAT_SERVICE_URL is set.
+
+    GET  /healthz
+    GET  /metrics, /metrics.json     stage latencies (Prometheus text or JSON)
+    GET  /stats                      gateway, cache and side-call counters plus stage latencies
+    GET  /sessions/{id}              {"session_id", "turns"}
+    GET  /sessions/{id}/turns        stored turns with their metadata (?limit=N for the last N,
+                                     ?since_seq=N for the turns from sequence number N on)
+    GET  /sessions/{id}/history      the conversation as chat messages (?limit=N, ?since_seq=N)
+    POST /sessions/{id}/turns        {"role", "content", ...turn stats}
+    WS   /sessions/{id}/chat         send {"text", "signals", "speak", "max_tokens"} for each turn, receive
+                                     {"type": "token", "text"} as the reply is generated, one binary frame
+                                     per spoken sentence when "speak" is set, then {"type": "done", "timing"}
+                                     (or {"type": "error", "message"})
+    POST /sessions/{id}/reports      {"header_text", "pronunciation_scores"} -> 202 {"job_id"}
+    GET  /reports/{job_id}           {"job_id", "status", "stage", "error", "pdf_filename"}
+    GET  /reports/{job_id}/pdf
+
+Closing the WebSocket during a reply cancels its completion upstream.
+
+    python -m chatbot.service --port 8000
+    CHAT_SERVICE_URL=http://127.0.0.1:8000 streamlit run app.py
+
+Needs `pip install starlette uvicorn`.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import threading
+
+from chatbot.core import TOKEN, ChatCore
+from report import HEADER_TEXT
+from report_jobs import DONE
+from stage_metrics import get_metrics
+
+ROLES = ("user", "assistant")
+# Turn stats a client may store with a turn; signals are the ones that come with the user's text
+SIGNALS = ("confidence", "pronunciation", "phonemes")
+TURN_STATS = ("latency", "ttft", "prompt_tokens") + SIGNALS
+
+
+def build_core():
+    """A chat core configured from the environment (CONVERSATION_DB, TTS_DRIVER, GROQ_API_KEY, GROQ_BASE_URL)."""
+    from conversation_store import ConversationStore
+    from llm_gateway import get_gateway
+    from report import generate_analysis_report
+    from report_assets import preload_assets
+    from report_jobs import ReportJobQueue
+    from tts_cache import TTSCache
+    from tts_service import TTSService
+
+    # Warm the static report images in the background, reports re-render them only if their source files change
+    threading.Thread(target=preload_assets, daemon=True).start()
+    tts_service = TTSService(driver=os.getenv('TTS_DRIVER', "dummy"), voice_index=1, rate=125, volume=1.0)
+    # Asked of a worker process once now, rather than by the first reply to be spoken
+    tts_service.voice_id
+    return ChatCore(
+        ConversationStore(os.getenv('CONVERSATION_DB', "conversations.db")),
+        get_gateway(),
+        tts_service=tts_service,
+        tts_cache=TTSCache(),
+        report_jobs=ReportJobQueue(generate_analysis_report, max_workers=2, ttl=15 * 60),
+    )
+
+
+def pick(values, names):
+    return {name: values[name] for name in names if isinstance(values, dict) and values.get(name) is not None}
+
+
+def job_state(job):
+    return {"job_id": job.id, "status": job.status, "stage": job.stage, "error": job.error,
+            "pdf_filename": job.pdf_filename}
+
+
+def create_app(core=None):
+    """The ASGI app serving `core`, or a core built from the environment (closed with the app)."""
+    from starlette.applications import Starlette
+    from starlette.exceptions import HTTPException
+    from starlette.responses import JSONResponse, PlainTextResponse, Response
+    from starlette.routing import Route, WebSocketRoute
+    from starlette.websockets import WebSocketDisconnect
+
+    owned = core is None
+    if owned:
+        core = build_core()
+
+    def number_of(request, name, default=None):
+        value = request.query_params.get(name)
+        if value is None:
+            return default
+        if not value.isdigit():
+            raise HTTPException(400, f"{name} must be a non-negative integer")
+        return int(value)
+
+    async def json_body(request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(400, "The body must be JSON")
+        if not isinstance(body, dict):
+            raise HTTPException(400, "The body must be a JSON object")
+        return body
+
+    def report_of(request):
+        job = core.report_job(request.path_params["job_id"])
+        if job is None:
+            raise HTTPException(404, "Unknown or expired report")
+        return job
+
+    # Plain functions run on Starlette's thread pool, so store reads never block the event loop
+    def health(request):
+        return JSONResponse({"status": "ok"})
+
+    def metrics(request):
+        return PlainTextResponse(get_metrics().prometheus_text(), media_type="text/plain; version=0.0.4")
+
+    def metrics_json(request):
+        return JSONResponse(get_metrics().snapshot())
+
+    def stats(request):
+        return JSONResponse({
+            "gateway": core.gateway.resilience_metrics(),
+            "completion_cache": core.gateway.cache_stats(),
+            "side_usage": core.gateway.side_usage_stats(),
+            "stages": get_metrics().snapshot(),
+        })
+
+    def session(request):
+        session_id = request.path_params["session_id"]
+        return JSONResponse({"session_id": session_id, "turns": core.count(session_id)})
+
+    def turns(request):
+        return JSONResponse(core.turns(request.path_params["session_id"], number_of(request, "limit"),
+                                       number_of(request, "since_seq", 0)))
+
+    def history(request):
+        return JSONResponse(core.history(request.path_params["session_id"], number_of(request, "limit"),
+                                         number_of(request, "since_seq", 0)))
+
+    async def add_turn(request):
+        body = await json_body(request)
+        if body.get("role") not in ROLES or not isinstance(body.get("content"), str):
+            raise HTTPException(400, "A turn needs a role (user or assistant) and its content")
+        await asyncio.to_thread(core.add_turn, request.path_params["session_id"], body["role"], body["content"],
+                                **pick(body, TURN_STATS))
+        return JSONResponse({"status": "ok"}, status_code=201)
+
+    async def submit_report(request):
+        body = await json_body(request)
+        scores = body.get("pronunciation_scores")
+        job_id = await asyncio.to_thread(
+            core.submit_report, request.path_params["session_id"], body.get("header_text") or HEADER_TEXT,
+            (lambda: scores) if scores else None,
+        )
+        return JSONResponse({"job_id": job_id}, status_code=202)
+
+    def report(request):
+        return JSONResponse(job_state(report_of(request)))
+
+    def report_pdf(request):
+        job = report_of(request)
+        if job.status != DONE:
+            raise HTTPException(409, f"The report is {job.status}")
+        return Response(job.pdf_data, media_type="application/pdf",
+                        headers={"Content-Disposition": f'attachment; filename="{job.pdf_filename}"'})
+
+    async def reply(websocket, session_id, message):
+        text = message.get("text")
+        if not isinstance(text, str) or not text.strip():
+            await websocket.send_json({"type": "error", "message": "The message has no text"})
+            return
+        max_tokens = message.get("max_tokens")
+        timings = []
+        args = (session_id, text.strip(), pick(message.get("signals"), SIGNALS), timings.append,
+                max_tokens if isinstance(max_tokens, int) and max_tokens > 0 else None)
+        try:
+            if message.get("speak"):
+                async with contextlib.aclosing(core.aspeak_reply(*args)) as events:
+                    async for kind, data in events:
+                        if kind == TOKEN:
+                            await websocket.send_json({"type": TOKEN, "text": data})
+                        else:
+                            await websocket.send_bytes(data)
+            else:
+                async with contextlib.aclosing(core.astream_reply(*args)) as chunks:
+                    async for chunk in chunks:
+                        await websocket.send_json({"type": TOKEN, "text": chunk})
+        except (WebSocketDisconnect, OSError):
+            raise
+        except Exception as e:
+            print(f"Reply for session {session_id} failed: {e}")
+            await websocket.send_json({"type": "error", "message": str(e)})
+            return
+        await websocket.send_json({"type": "done", "timing": timings[0]})
+
+    async def chat(websocket):
+        session_id = websocket.path_params["session_id"]
+        await websocket.accept()
+        try:
+            while True:
+                try:
+                    message = await websocket.receive_json()
+                except ValueError:
+                    await websocket.send_json({"type": "error", "message": "Messages must be JSON"})
+                    continue
+                await reply(websocket, session_id, message if isinstance(message, dict) else {})
+        except (WebSocketDisconnect, OSError):
+            # The client went away, leaving the loop closed its reply and cancelled the completion
+            pass
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        if owned:
+            # Queued turns are written before the process exits
+            core.store.close()
+            if core.tts_service is not None:
+                core.tts_service.shutdown()
+
+    return Starlette(routes=[
+        Route("/healthz", health),
+        Route("/metrics", metrics),
+        Route("/metrics.json", metrics_json),
+        Route("/stats", stats),
+        Route("/sessions/{session_id}", session),
+        Route("/sessions/{session_id}/turns", turns, methods=["GET"]),
+        Route("/sessions/{session_id}/turns", add_turn, methods=["POST"]),
+        Route("/sessions/{session_id}/history", history),
+        WebSocketRoute("/sessions/{session_id}/chat", chat),
+        Route("/sessions/{session_id}/reports", submit_report, methods=["POST"]),
+        Route("/reports/{job_id}", report),
+        Route("/reports/{job_id}/pdf", report_pdf),
+    ], lifespan=lifespan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chatbot over HTTP and WebSockets.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    import uvicorn
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # Stage latencies are also appended to METRICS_JSONL when it is set
+    get_metrics(jsonl_path=os.getenv('METRICS_JSONL'))
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == '__main__':
+    main()
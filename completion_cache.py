@@ -0,0 +1,63 @@
+"""Exact-match cache for completions of repeated prompts.
+
+Entries are keyed by a hash of the model, the sampling parameters and the
+whitespace-normalised message list, expire after a TTL and are evicted least
+recently used first. Caching is opt-in per call: it suits deterministic,
+repeatable prompts like report analysis, not free chat.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def completion_key(messages, **params):
+    """Hash the model, sampling parameters and normalised messages of a request."""
+    normalized = [{"role": msg["role"], "content": " ".join(msg["content"].split())} for msg in messages]
+    raw = json.dumps({"params": params, "messages": normalized}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """LRU cache of completion texts with a TTL and hit/miss counters."""
+
+    def __init__(self, max_entries=256, ttl=60 * 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored at, text)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached text for a key, or None if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, text):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), text)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
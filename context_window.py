@@ -0,0 +1,121 @@
+"""Token-budgeted sliding-window context for the chat completions.
+
+The full conversation is kept for display, but only a bounded prompt is sent
+to the model: the pinned intro turn, a rolling summary of older turns and the
+most recent turns verbatim.
+"""
+
+import re
+
+# Rough characters-per-token ratio for Llama 3 on English chat text
+CHARS_PER_TOKEN = 4
+# Fixed cost of the role/separator tokens wrapped around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Cheaply estimate the number of tokens in a piece of text."""
+    if not text:
+        return 0
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages):
+    """Estimate the prompt tokens for a list of chat messages."""
+    return sum(estimate_tokens(msg['content']) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+
+
+def summarize_turn(msg, max_chars=160):
+    """Fold a single turn into one short summary line (first sentence, clipped)."""
+    text = " ".join(msg['content'].split())
+    first_sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars - 3].rstrip() + "..."
+    speaker = "User" if msg['role'] == 'user' else "Bot"
+    return f"{speaker}: {first_sentence}"
+
+
+class ContextWindow:
+    """Builds prompts under a token budget from an ever-growing conversation history.
+
+    Older turns are folded into the summary exactly once, as they fall out of the
+    recent window, so the summary is updated incrementally instead of recomputed.
+    """
+
+    def __init__(self, max_tokens=3000, keep_recent=8, pinned=1, summary_tokens=600,
+                 summarize=summarize_turn):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.pinned = pinned
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.pinned_messages = []
+        self.summary_lines = []
+        self.folded = 0  # number of unpinned turns already folded into the summary
+        self.last_prompt_tokens = 0
+
+    def reset(self):
+        self.pinned_messages = []
+        self.summary_lines = []
+        self.folded = 0
+
+    def resume_from(self):
+        """Position of the first turn the next build() needs; the ones before it are pinned or folded."""
+        if len(self.pinned_messages) < self.pinned:
+            return 0
+        return self.pinned + self.folded
+
+    def _fold(self, msg):
+        self.summary_lines.append(self.summarize(msg))
+        # Keep the summary itself bounded by dropping its oldest lines
+        while len(self.summary_lines) > 1 and estimate_tokens("\n".join(self.summary_lines)) > self.summary_tokens:
+            self.summary_lines.pop(0)
+
+    def _assemble(self, recent):
+        messages = list(self.pinned_messages)
+        if self.summary_lines:
+            messages.append({
+                "role": "system",
+                "content": "Summary of the earlier conversation:\n" + "\n".join(self.summary_lines),
+            })
+        messages.extend(recent)
+        return messages
+
+    def build(self, history, start=0):
+        """Return the messages to send for this turn and note their token count in last_prompt_tokens.
+
+        `history` is the conversation from position `start` on, either the
+        whole of it (0) or from resume_from(), so a long conversation is not
+        re-read for every turn.
+        """
+        if start == 0:
+            # The history was cleared or replaced, start over
+            if self.folded > len(history) - self.pinned:
+                self.reset()
+            self.pinned_messages = history[:self.pinned]
+            rest = history[self.pinned + self.folded:]
+        else:
+            rest = history
+
+        # Fold turns that have fallen out of the recent window
+        skipped = 0
+        while len(rest) - skipped > self.keep_recent:
+            self._fold(rest[skipped])
+            skipped += 1
+
+        messages = self._assemble(rest[skipped:])
+
+        # Still over budget (long turns), fold more but always keep the latest turn
+        while count_message_tokens(messages) > self.max_tokens and len(rest) - skipped > 1:
+            self._fold(rest[skipped])
+            skipped += 1
+            messages = self._assemble(rest[skipped:])
+
+        # Nothing left to fold, shorten the summary instead
+        while count_message_tokens(messages) > self.max_tokens and self.summary_lines:
+            self.summary_lines.pop(0)
+            messages = self._assemble(rest[skipped:])
+
+        self.folded += skipped
+        self.last_prompt_tokens = count_message_tokens(messages)
+        return messages
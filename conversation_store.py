@@ -0,0 +1,405 @@
+"""Persistent conversation store.
+
+Every user and assistant turn is appended to a SQLite database in WAL mode
+with its session id, timestamp, latency and token counts. Appends go into an
+in-memory queue that a writer thread commits in batches, so a chat turn never
+waits for the disk; reads merge the turns that are still queued, so a session
+always sees its own writes. A session's history is read on demand through the
+(session_id, seq) index rather than held in memory, so it survives restarts and
+is shared by every process that opens the same file. Sequence numbers are only
+given out by the writer, inside the transaction that stores the turns, so
+writers in several processes never hand out the same one. A batch that still
+fails to commit after `max_attempts` tries is dropped and reported, so a
+lasting error (disk full, schema mismatch) cannot grow the queue forever.
+
+The writer also folds every committed turn into per-session weekly progress
+aggregates (turns, reply latency, speech recognition confidence, pronunciation
+scores and phonemes practised) in the same transaction, so progress charts
+read a few precomputed rows instead of rescanning the turns.
+
+Sessions can be exported as JSON lines for offline analysis:
+
+    python conversation_store.py export conversations.jsonl
+    python conversation_store.py export one_session.jsonl --session 3f2a...
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    latency REAL,
+    ttft REAL,
+    tokens INTEGER,
+    prompt_tokens INTEGER,
+    confidence REAL,
+    pronunciation REAL,
+    phonemes TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS turns_session_seq ON turns (session_id, seq);
+CREATE TABLE IF NOT EXISTS weekly_progress (
+    session_id TEXT NOT NULL,
+    week TEXT NOT NULL,
+    turns INTEGER NOT NULL,
+    user_turns INTEGER NOT NULL,
+    reply_count INTEGER NOT NULL,
+    reply_latency_sum REAL NOT NULL,
+    confidence_count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    pronunciation_count INTEGER NOT NULL,
+    pronunciation_sum REAL NOT NULL,
+    phonemes_practised INTEGER NOT NULL,
+    PRIMARY KEY (session_id, week)
+);
+"""
+
+COLUMNS = ("session_id", "seq", "role", "content", "created_at", "latency", "ttft", "tokens", "prompt_tokens",
+           "confidence", "pronunciation", "phonemes")
+
+# Columns added to the turns table after its first release, with their types
+ADDED_COLUMNS = (("confidence", "REAL"), ("pronunciation", "REAL"), ("phonemes", "TEXT"))
+
+PROGRESS_COLUMNS = ("turns", "user_turns", "reply_count", "reply_latency_sum", "confidence_count", "confidence_sum",
+                    "pronunciation_count", "pronunciation_sum", "phonemes_practised")
+
+INSERT_TURN = (f"INSERT INTO turns ({', '.join(COLUMNS)}) "
+               f"VALUES ({', '.join('?' for _ in COLUMNS)})")
+
+UPSERT_PROGRESS = (
+    f"INSERT INTO weekly_progress (session_id, week, {', '.join(PROGRESS_COLUMNS)}) "
+    f"VALUES (?, ?, {', '.join('?' for _ in PROGRESS_COLUMNS)}) "
+    f"ON CONFLICT (session_id, week) DO UPDATE SET "
+    + ", ".join(f"{column} = {column} + excluded.{column}" for column in PROGRESS_COLUMNS)
+)
+
+# Rebuilds the aggregates from the turns of a database written before they existed
+BACKFILL_PROGRESS = f"""
+INSERT INTO weekly_progress (session_id, week, {', '.join(PROGRESS_COLUMNS)})
+SELECT session_id, date(created_at, 'unixepoch', 'weekday 0', '-6 days'),
+       COUNT(*), TOTAL(role = 'user'), COUNT(latency), TOTAL(latency), COUNT(confidence), TOTAL(confidence),
+       COUNT(pronunciation), TOTAL(pronunciation),
+       TOTAL(CASE WHEN phonemes IS NULL OR phonemes = '' THEN 0
+                  ELSE length(phonemes) - length(replace(phonemes, ',', '')) + 1 END)
+FROM turns GROUP BY 1, 2
+"""
+
+
+def week_of(timestamp):
+    """Monday (UTC) of the week a Unix time falls in, as YYYY-MM-DD."""
+    day = int(timestamp // 86400)
+    # 1 January 1970 was a Thursday
+    return time.strftime('%Y-%m-%d', time.gmtime((day - (day + 3) % 7) * 86400))
+
+
+def progress_deltas(rows):
+    """Fold turns into (session id, week, *PROGRESS_COLUMNS) increments of the weekly aggregates."""
+    deltas = {}
+    for row in rows:
+        key = (row["session_id"], week_of(row["created_at"]))
+        delta = deltas.setdefault(key, [0] * len(PROGRESS_COLUMNS))
+        delta[0] += 1
+        if row["role"] == "user":
+            delta[1] += 1
+        if row["latency"] is not None:
+            delta[2] += 1
+            delta[3] += row["latency"]
+        if row["confidence"] is not None:
+            delta[4] += 1
+            delta[5] += row["confidence"]
+        if row["pronunciation"] is not None:
+            delta[6] += 1
+            delta[7] += row["pronunciation"]
+        if row["phonemes"]:
+            delta[8] += len(row["phonemes"].split(","))
+    return [key + tuple(delta) for key, delta in deltas.items()]
+
+
+class ConversationStore:
+    """Append-only turn log in SQLite with batched background writes."""
+
+    def __init__(self, path='conversations.db', flush_interval=0.2, batch_size=256, max_attempts=5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.local = threading.local()
+        self._create_schema()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.pending = []  # queued rows, oldest first
+        self.writing = []  # rows of the batch being committed
+        self.failed_attempts = 0  # failed commits of the batch in a row
+        self.dropped = 0  # turns given up on after max_attempts failed commits
+        self.closed = False
+        self.writer = threading.Thread(target=self._write_loop, name="conversation-store", daemon=True)
+        self.writer.start()
+
+    def _connection(self):
+        """One connection per thread, SQLite connections are not shared across threads."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL only syncs at checkpoints, a commit does not wait for fsync
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _create_schema(self):
+        connection = self._connection()
+        with connection:
+            # Processes opening a new or older database together wait here, so only the first one migrates it
+            connection.execute("BEGIN IMMEDIATE")
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(turns)")}
+            had_progress = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weekly_progress'").fetchone()
+            # Statement by statement, executescript() would commit the transaction first
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+            for column, kind in ADDED_COLUMNS:
+                if columns and column not in columns:
+                    connection.execute(f"ALTER TABLE turns ADD COLUMN {column} {kind}")
+            if not had_progress:
+                connection.execute(BACKFILL_PROGRESS)
+
+    def append(self, session_id, role, content, latency=None, ttft=None, tokens=None, prompt_tokens=None,
+               confidence=None, pronunciation=None, phonemes=None):
+        """Queue a turn for writing; it gets its sequence number in the session when it is committed.
+
+        User turns can carry the speech recognition `confidence` (0-1), the
+        mean `pronunciation` score (0-100) and the `phonemes` practised in them.
+        """
+        with self.lock:
+            self.pending.append({
+                "session_id": session_id, "seq": None, "role": role, "content": content,
+                "created_at": time.time(), "latency": latency, "ttft": ttft,
+                "tokens": tokens, "prompt_tokens": prompt_tokens,
+                "confidence": confidence, "pronunciation": pronunciation,
+                "phonemes": ",".join(phonemes) if phonemes else None,
+            })
+            if len(self.pending) >= self.batch_size:
+                self.changed.notify()
+
+    def _number(self, connection):
+        """Give the rows being written the next sequence numbers of their sessions."""
+        next_seq = {}
+        for row in self.writing:
+            if row["session_id"] not in next_seq:
+                last = connection.execute(
+                    "SELECT MAX(seq) FROM turns WHERE session_id = ?", (row["session_id"],)).fetchone()[0]
+                next_seq[row["session_id"]] = 0 if last is None else last + 1
+        with self.lock:
+            for row in self.writing:
+                row["seq"] = next_seq[row["session_id"]]
+                next_seq[row["session_id"]] += 1
+
+    def _write_loop(self):
+        while True:
+            with self.lock:
+                if not self.pending and not self.closed:
+                    self.changed.wait(self.flush_interval)
+                if not self.pending:
+                    if self.closed:
+                        return
+                    continue
+                self.writing, self.pending = self.pending, []
+            try:
+                with self._connection() as connection:
+                    # Take the write lock first, so no other process numbers turns between our read and insert
+                    connection.execute("BEGIN IMMEDIATE")
+                    self._number(connection)
+                    connection.executemany(INSERT_TURN, [tuple(row[column] for column in COLUMNS)
+                                                         for row in self.writing])
+                    connection.executemany(UPSERT_PROGRESS, progress_deltas(self.writing))
+            except sqlite3.Error as e:
+                self.failed_attempts += 1
+                if self.failed_attempts >= self.max_attempts:
+                    # A lasting error (disk full, schema mismatch) would otherwise keep the queue growing forever
+                    print(f"Dropped {len(self.writing)} conversation turns after {self.failed_attempts} "
+                          f"failed writes: {e}")
+                    with self.lock:
+                        self.dropped += len(self.writing)
+                        self.writing = []
+                        self.failed_attempts = 0
+                        self.changed.notify_all()
+                    continue
+                print(f"Error writing conversation turns: {e}")
+                # Keep the rows queued and try again on the next flush, numbered afresh
+                with self.lock:
+                    for row in self.writing:
+                        row["seq"] = None
+                    self.pending[:0] = self.writing
+                    self.writing = []
+                time.sleep(self.flush_interval * self.failed_attempts)
+                continue
+            with self.lock:
+                self.writing = []
+                self.failed_attempts = 0
+                self.changed.notify_all()
+
+    def flush(self, timeout=10.0):
+        """Wait until every queued turn is committed."""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self.changed.notify_all()
+            while self.pending or self.writing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.changed.wait(remaining)
+        return True
+
+    def _queued(self, session_id):
+        with self.lock:
+            return [row for row in self.writing + self.pending if row["session_id"] == session_id]
+
+    def _unstored(self, queued, committed):
+        """Copies of the queued rows that were not committed yet when `committed` turns were.
+
+        The writer numbers a batch before committing it and numbers only
+        increase, so a queued row is already stored exactly when its number is
+        below the committed count.
+        """
+        with self.lock:
+            return [dict(row) for row in queued if row["seq"] is None or row["seq"] >= committed]
+
+    def turns(self, session_id, limit=None, since_seq=0):
+        """Stored turns of a session with their metadata, oldest first.
+
+        Only turns from sequence number `since_seq` on are read, and only the
+        last `limit` of them if given. Turns still waiting for the writer come
+        last, with no sequence number yet.
+        """
+        queued = self._queued(session_id)
+        query = f"SELECT {', '.join(COLUMNS)} FROM turns WHERE session_id = ? AND seq >= ? ORDER BY seq"
+        connection = self._connection()
+        # One read transaction, so the rows and the committed count come from the same snapshot
+        connection.execute("BEGIN")
+        try:
+            last = connection.execute("SELECT MAX(seq) FROM turns WHERE session_id = ?", (session_id,)).fetchone()[0]
+            if limit is None:
+                rows = connection.execute(query, (session_id, since_seq)).fetchall()
+            else:
+                rows = connection.execute(query + " DESC LIMIT ?", (session_id, since_seq, limit)).fetchall()[::-1]
+        finally:
+            connection.commit()
+        committed = 0 if last is None else last + 1
+        # Unstored turns follow the committed ones, in the order they were appended
+        unstored = self._unstored(queued, committed)
+        turns = [dict(row) for row in rows] + unstored[max(0, since_seq - committed):]
+        if limit is not None:
+            turns = turns[-limit:] if limit else []
+        return turns
+
+    def history(self, session_id, limit=None, since_seq=0):
+        """A session's conversation as chat messages, oldest first; see turns() for `limit` and `since_seq`."""
+        return [{"role": turn["role"], "content": turn["content"]}
+                for turn in self.turns(session_id, limit, since_seq)]
+
+    def count(self, session_id):
+        """Number of turns in a session, queued ones included."""
+        queued = self._queued(session_id)
+        last = self._connection().execute(
+            "SELECT MAX(seq) FROM turns WHERE session_id = ?", (session_id,)).fetchone()[0]
+        # Sequence numbers run from 0 without gaps
+        committed = 0 if last is None else last + 1
+        return committed + len(self._unstored(queued, committed))
+
+    def sessions(self, since=None):
+        """Committed sessions with their turn count and last activity, least recently active first."""
+        self.flush()
+        query = "SELECT session_id, COUNT(*) AS turns, MAX(created_at) AS last_turn_at FROM turns GROUP BY session_id"
+        args = []
+        if since is not None:
+            query += " HAVING MAX(created_at) >= ?"
+            args.append(since)
+        return [dict(row) for row in self._connection().execute(query + " ORDER BY last_turn_at", args)]
+
+    def weekly_progress(self, session_id):
+        """A session's progress per week, oldest first, read from the running aggregates.
+
+        Averages are None for weeks without any measurement of them.
+        """
+        self.flush()
+        rows = self._connection().execute(
+            f"SELECT week, {', '.join(PROGRESS_COLUMNS)} FROM weekly_progress WHERE session_id = ? ORDER BY week",
+            (session_id,),
+        ).fetchall()
+        return [{
+            "week": row["week"],
+            "turns": row["turns"],
+            "user_turns": row["user_turns"],
+            "phonemes_practised": row["phonemes_practised"],
+            "reply_latency": row["reply_latency_sum"] / row["reply_count"] if row["reply_count"] else None,
+            "confidence": row["confidence_sum"] / row["confidence_count"] if row["confidence_count"] else None,
+            "pronunciation": row["pronunciation_sum"] / row["pronunciation_count"] if row["pronunciation_count"] else None,
+        } for row in rows]
+
+    def iter_turns(self, session_id=None, since=None, chunk_size=500):
+        """Stream committed turns of one or all sessions for export, without loading them all at once."""
+        self.flush()
+        query = f"SELECT {', '.join(COLUMNS)} FROM turns"
+        conditions, args = [], []
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            args.append(session_id)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            args.append(since)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        cursor = self._connection().execute(query + " ORDER BY session_id, seq", args)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+
+    def export(self, path, session_id=None, since=None):
+        """Write turns as JSON lines and return how many were written."""
+        count = 0
+        with open(path, 'w', encoding='utf-8') as export_file:
+            for turn in self.iter_turns(session_id, since):
+                export_file.write(json.dumps(turn, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.changed.notify_all()
+        self.writer.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export conversations from the conversation store.")
+    parser.add_argument('--db', default='conversations.db', help="database file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help="write turns as JSON lines")
+    export.add_argument('output', help="JSON-lines file to write")
+    export.add_argument('--session', help="only export this session")
+    export.add_argument('--since', type=float, help="only export turns from this Unix time on")
+    args = parser.parse_args()
+
+    store = ConversationStore(args.db)
+    try:
+        count = store.export(args.output, args.session, args.since)
+    finally:
+        store.close()
+    print(f"Exported {count} turns to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
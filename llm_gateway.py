@@ -0,0 +1,430 @@
+"""Process-wide gateway for Groq chat completions.
+
+The Streamlit scripts re-execute on every interaction, so a client built at the
+top of a script is rebuilt on every rerun. The gateway is built once per process
+instead: it runs the async Groq client on its own event loop thread, over one
+pooled HTTP connection manager, so TLS connections are reused across turns and
+sessions. The number of in-flight completions is capped globally and per
+session. Closing a completion's stream cancels its request; a request that is
+cancelled raises CompletionCancelled in its stream rather than just ending it,
+so a cut-off reply is never mistaken for a complete one.
+
+Every request goes through the policies in llm_resilience.py: retries with
+backoff, a hedged second request when the first token is late, and a circuit
+breaker that answers with a canned response while the upstream is unhealthy.
+
+Callers can opt in to an exact-match response cache for repeatable prompts.
+
+Stateless analytical calls (reports, summaries, classification) go through
+side_complete() instead of the chat methods. They have their own model and
+sampling defaults, their own small concurrency limit, no hedging and their own
+token accounting, so a burst of report work neither takes the slots of chat
+turns nor skews the time-to-first-token statistics that chat hedging uses.
+
+Callers on an event loop of their own (the chat service) use astream_chat(),
+which hands the tokens over to their loop instead of blocking a thread on them.
+
+Point GROQ_BASE_URL at a local stand-in (see mock_groq.py) to run against a mock.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from completion_cache import CompletionCache, completion_key
+from context_window import estimate_tokens
+from llm_resilience import (CANNED_RESPONSE, TRIAL, CircuitBreaker, HedgePolicy, ResilienceMetrics,
+                            RetryPolicy, is_retryable)
+
+_DONE = object()
+
+
+class CompletionCancelled(Exception):
+    """The completion was cancelled before it finished."""
+
+
+CHAT = "chat"
+SIDE = "side"
+
+# Analytical calls want steadier, longer answers than chat turns
+SIDE_DEFAULTS = {
+    "model": "llama3-8b-8192",
+    "temperature": 0.3,
+    "max_tokens": 400,
+    "top_p": 0.9,
+}
+
+
+class TokenUsage:
+    """Calls and estimated prompt/completion tokens per purpose."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.purposes = defaultdict(lambda: {"calls": 0, "cached": 0, "prompt_tokens": 0, "completion_tokens": 0})
+
+    def record(self, purpose, prompt_tokens, completion_tokens, cached=False):
+        with self.lock:
+            usage = self.purposes[purpose]
+            usage["calls"] += 1
+            usage["cached"] += int(cached)
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+
+    def snapshot(self):
+        with self.lock:
+            return {purpose: dict(usage) for purpose, usage in self.purposes.items()}
+
+
+class LoopQueue:
+    """Hands items put on the gateway loop to an asyncio queue on another event loop."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item):
+        # The caller's loop is gone once it has shut down, nobody is reading anymore
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+
+class LLMGateway:
+    """Async Groq client with pooled connections and bounded concurrency."""
+
+    def __init__(self, api_key=None, base_url=None, max_in_flight=32, max_per_session=2,
+                 max_connections=64, max_keepalive=32, timeout=60.0,
+                 retry_policy=None, hedge_policy=None, breaker=None, canned_response=CANNED_RESPONSE,
+                 cache=None, max_side_in_flight=4, side_defaults=None):
+        self.max_in_flight = max_in_flight
+        self.max_per_session = max_per_session
+        self.max_side_in_flight = max_side_in_flight
+        self.side_defaults = dict(SIDE_DEFAULTS, **(side_defaults or {}))
+        self.side_usage = TokenUsage()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.hedge_policy = hedge_policy or HedgePolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.canned_response = canned_response
+        self.metrics = ResilienceMetrics()
+        self.cache = cache or CompletionCache()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-gateway", daemon=True)
+        self.thread.start()
+        self.session_tasks = defaultdict(set)
+        self.lock = threading.Lock()
+        self._call(self._setup(api_key, base_url, max_connections, max_keepalive, timeout)).result()
+
+    async def _setup(self, api_key, base_url, max_connections, max_keepalive, timeout):
+        import httpx
+        from groq import AsyncGroq
+
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=timeout,
+        )
+        self.client = AsyncGroq(
+            api_key=api_key or os.getenv('GROQ_API_KEY'),
+            base_url=base_url or os.getenv('GROQ_BASE_URL'),
+            http_client=self.http_client,
+            max_retries=0,  # Retries are handled by the gateway's own policy
+        )
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        self.side_in_flight = asyncio.Semaphore(self.max_side_in_flight)
+        self.session_slots = defaultdict(lambda: asyncio.Semaphore(self.max_per_session))
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def _contents(self, params):
+        """Yield the non-empty text deltas of one streamed completion."""
+        completion = await self.client.chat.completions.create(stream=True, **params)
+        async for chunk in completion:
+            if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
+                content = chunk.choices[0].delta.content or ""
+                if content:
+                    yield content
+
+    async def _first_content(self, params):
+        """Start a completion and wait for its first token; returns (token, rest of the stream)."""
+        contents = self._contents(params)
+        try:
+            return await contents.__anext__(), contents
+        except StopAsyncIteration:
+            return None, contents
+
+    async def _discard(self, task):
+        task.cancel()
+        try:
+            _, contents = await task
+        except BaseException:
+            return
+        await contents.aclose()
+
+    async def _hedged_first_content(self, params):
+        """Wait for a first token, sending a hedged duplicate request if it is late."""
+        start_time = time.perf_counter()
+        primary = asyncio.ensure_future(self._first_content(params))
+        hedge_after = self.hedge_policy.hedge_after()
+        if hedge_after is not None:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if not done:
+                self.metrics.incr("hedges_sent")
+                hedge = asyncio.ensure_future(self._first_content(params))
+                try:
+                    done, _ = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+                    # Prefer whichever answered successfully, the other may still come through
+                    winner = next((task for task in done if task.exception() is None), None)
+                    if winner is None:
+                        # The first to finish failed, give the other one its chance
+                        others = {primary, hedge} - done
+                        if others:
+                            await asyncio.wait(others)
+                            winner = others.pop()
+                        else:
+                            winner = primary
+                except BaseException:
+                    await self._discard(primary)
+                    await self._discard(hedge)
+                    raise
+                loser = hedge if winner is primary else primary
+                await self._discard(loser)
+                if winner is hedge:
+                    self.metrics.incr("hedge_wins")
+                first, contents = await winner
+                self.hedge_policy.record_ttft(time.perf_counter() - start_time)
+                return first, contents
+        first, contents = await primary
+        self.hedge_policy.record_ttft(time.perf_counter() - start_time)
+        return first, contents
+
+    async def _stream_resilient(self, params, out, hedge=True):
+        """Stream one completion into `out` unless the circuit breaker is open.
+
+        Returns False when the canned response was served instead of the upstream's.
+        """
+        allowed = self.breaker.allow()
+        if not allowed:
+            self.metrics.incr("breaker_rejections")
+            out.put(self.canned_response)
+            return False
+        try:
+            await self._stream_upstream(params, out, hedge)
+        except asyncio.CancelledError:
+            # A cancelled trial says nothing about the upstream, the next request tries again
+            if allowed == TRIAL:
+                self.breaker.release_trial()
+            raise
+        return True
+
+    async def _stream_upstream(self, params, out, hedge):
+        """Stream one completion into `out`, retrying failures that happen before the first token."""
+        attempt = 0
+        while True:
+            try:
+                if hedge:
+                    first, contents = await self._hedged_first_content(params)
+                else:
+                    first, contents = await self._first_content(params)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered (e.g. a 400), so it is healthy even though the request failed
+                    self.breaker.record_success()
+                    raise
+                if attempt >= self.retry_policy.max_retries:
+                    self.breaker.record_failure()
+                    self.metrics.incr("failures")
+                    raise
+                self.metrics.incr("retries")
+                await asyncio.sleep(self.retry_policy.delay(attempt, e))
+                attempt += 1
+
+        try:
+            if first is not None:
+                out.put(first)
+            async for content in contents:
+                out.put(content)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            self.metrics.incr("failures")
+            raise
+        finally:
+            await contents.aclose()
+        self.breaker.record_success()
+
+    async def _stream(self, session_id, params, out, lane=CHAT):
+        slots = self.session_slots[session_id] if session_id else None
+        try:
+            if slots:
+                await slots.acquire()
+            try:
+                if lane == SIDE:
+                    async with self.side_in_flight:
+                        from_upstream = await self._stream_resilient(params, out, hedge=False)
+                else:
+                    async with self.in_flight:
+                        from_upstream = await self._stream_resilient(params, out)
+            finally:
+                if slots:
+                    slots.release()
+            out.put((_DONE, from_upstream))
+        except asyncio.CancelledError:
+            out.put(CompletionCancelled())
+            raise
+        except Exception as e:
+            out.put(e)
+
+    def _start(self, session_id, params, out, lane):
+        """Run a completion on the gateway loop, streaming into `out`, and return its future."""
+        future = self._call(self._stream(session_id, params, out, lane))
+        self._track(session_id, future)
+
+        def cancelled(_):
+            # A request cancelled before it started cannot report that itself
+            if future.cancelled():
+                out.put(CompletionCancelled())
+
+        future.add_done_callback(cancelled)
+        return future
+
+    def _track(self, session_id, future):
+        with self.lock:
+            self.session_tasks[session_id].add(future)
+
+        def forget(_):
+            with self.lock:
+                tasks = self.session_tasks.get(session_id)
+                if tasks is not None:
+                    tasks.discard(future)
+                    if not tasks:
+                        del self.session_tasks[session_id]
+                        self.session_slots.pop(session_id, None)
+
+        future.add_done_callback(forget)
+
+    def stream_chat(self, messages, session_id=None, cache=False, **params):
+        """Yield the text of a streamed completion as it arrives.
+
+        With cache=True an identical earlier request is answered from the completion
+        cache without going upstream. Closing the generator early (e.g. the script
+        run is stopped) cancels the request.
+        """
+        key = None
+        if cache:
+            key = completion_key(messages, **params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        yield from self._stream_text(messages, session_id, key, CHAT, params)
+
+    def _stream_text(self, messages, session_id, key, lane, params):
+        """Yield the text of an upstream completion, caching it under `key` unless that is None."""
+        out = queue.Queue()
+        future = self._start(session_id, dict(params, messages=messages), out, lane)
+        response_text = ""
+        try:
+            while True:
+                item = out.get()
+                if isinstance(item, tuple) and item[0] is _DONE:
+                    # Canned responses from the circuit breaker are never cached
+                    if key is not None and item[1]:
+                        self.cache.put(key, response_text)
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                response_text += item
+                yield item
+        finally:
+            future.cancel()
+
+    async def astream_chat(self, messages, session_id=None, cache=False, **params):
+        """Async version of stream_chat() for callers running their own event loop.
+
+        Closing the generator early (e.g. the client disconnects) cancels the request.
+        """
+        key = None
+        if cache:
+            key = completion_key(messages, **params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        out = LoopQueue(asyncio.get_running_loop())
+        future = self._start(session_id, dict(params, messages=messages), out, CHAT)
+        response_text = ""
+        try:
+            while True:
+                item = await out.queue.get()
+                if isinstance(item, tuple) and item[0] is _DONE:
+                    if key is not None and item[1]:
+                        self.cache.put(key, response_text)
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                response_text += item
+                yield item
+        finally:
+            future.cancel()
+
+    def complete(self, messages, session_id=None, cache=False, **params):
+        """Return the full text of a completion."""
+        return "".join(self.stream_chat(messages, session_id=session_id, cache=cache, **params))
+
+    def side_complete(self, prompt, purpose="analysis", cache=True, **params):
+        """Return the full text of a stateless completion that is no part of any chat.
+
+        `prompt` is a string (sent as one user message) or a message list, and
+        `params` override SIDE_DEFAULTS. Identical requests are served from the
+        cache unless cache=False. Tokens are accounted per `purpose`.
+        """
+        messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+        params = dict(self.side_defaults, **params)
+        key = completion_key(messages, **params) if cache else None
+        text = self.cache.get(key) if key else None
+        cached = text is not None
+        if not cached:
+            text = "".join(self._stream_text(messages, None, key, SIDE, params))
+        self.side_usage.record(purpose, sum(estimate_tokens(msg["content"]) for msg in messages),
+                               estimate_tokens(text), cached)
+        return text
+
+    def resilience_metrics(self):
+        """Retry/hedge/breaker counters plus the current breaker state."""
+        metrics = self.metrics.snapshot()
+        metrics["breaker_state"] = self.breaker.state
+        metrics["hedge_after"] = self.hedge_policy.hedge_after()
+        return metrics
+
+    def side_usage_stats(self):
+        return self.side_usage.snapshot()
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def in_flight_count(self):
+        with self.lock:
+            return sum(len(tasks) for tasks in self.session_tasks.values())
+
+    def close(self):
+        self._call(self.http_client.aclose()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway(**kwargs):
+    """Return the gateway of this process, building it on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(**kwargs)
+        return _gateway
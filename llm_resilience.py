@@ -0,0 +1,163 @@
+"""Retry, hedging and circuit-breaking policies for the LLM gateway.
+
+- Retries use jittered exponential backoff on 429/5xx and connection errors,
+  and honour the upstream's Retry-After header.
+- Hedging sends a second identical request when the first has not produced a
+  token within the observed p95 time-to-first-token; the first to answer wins.
+- The circuit breaker opens after repeated failures so callers fail fast to a
+  canned response until the upstream has had time to recover.
+"""
+
+import collections
+import random
+import threading
+import time
+
+CANNED_RESPONSE = (
+    "I'm having a little trouble thinking right now, but you're doing great! "
+    "Let's keep practising while I catch up. Can you say 'p' and 'b' for me?"
+)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# What CircuitBreaker.allow() returns for the one request that tests a half-open breaker
+TRIAL = "trial"
+
+
+def status_code(error):
+    """HTTP status of an API error, or None for connection errors and the like."""
+    return getattr(error, 'status_code', None)
+
+
+def retry_after(error):
+    """Seconds from the Retry-After header of an API error, if it has one."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """Rate limits, server errors and connection failures are worth retrying."""
+    code = status_code(error)
+    if code is not None:
+        return code in RETRY_STATUSES
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that defers to Retry-After when the server sends it."""
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=8.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, error):
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            return min(server_delay, self.max_delay)
+        # Full jitter keeps many sessions from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class HedgePolicy:
+    """Decides how long to wait for a first token before sending a hedged request."""
+
+    def __init__(self, enabled=True, quantile=0.95, min_samples=20, floor=0.25, default_after=2.0):
+        self.enabled = enabled
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.floor = floor
+        self.default_after = default_after
+        self.ttft_samples = collections.deque(maxlen=500)
+        self.lock = threading.Lock()
+
+    def record_ttft(self, seconds):
+        with self.lock:
+            self.ttft_samples.append(seconds)
+
+    def hedge_after(self):
+        """Seconds to wait for a first token, or None when hedging is off."""
+        if not self.enabled:
+            return None
+        with self.lock:
+            samples = sorted(self.ttft_samples)
+        if len(samples) < self.min_samples:
+            return self.default_after
+        return max(self.floor, samples[min(len(samples) - 1, int(len(samples) * self.quantile))])
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one trial request through after a cooldown.
+
+    A trial that never reports back (cancelled, or lost) does not keep the
+    breaker half-open: release_trial() or another `reset_timeout` lets the
+    next request try instead.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """True when a request may go upstream, TRIAL when it is the one testing a half-open breaker."""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.trial_started = None
+            if self.state == HALF_OPEN:
+                if self.trial_started is None or now - self.trial_started >= self.reset_timeout:
+                    self.trial_started = now
+                    return TRIAL
+                return False
+            return self.state == CLOSED
+
+    def release_trial(self):
+        """The trial request ended without an outcome, let the next request be the trial."""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.trial_started = None
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class ResilienceMetrics:
+    """Counters for retries, hedges and breaker activity."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
@@ -0,0 +1,343 @@
+"""Offline load test for the chat pipeline.
+
+Starts the local Groq stand-in (mock_groq.py), then drives N concurrent
+headless sessions of an entry script with Streamlit's AppTest. Every session
+types its turns through the real streamed reply and sentence-by-sentence
+speech flow and finally generates a report. With --service the sessions are
+thin clients of a chat service (python -m chatbot.service) started in its own
+process, as in a deployment with CHAT_SERVICE_URL set, and with
+--session-state their session state is kept in the key-value stand-in
+(mock_kv.py) as with SESSION_STATE_URL. TTS uses the "silence" driver, so no API key,
+microphone or installed voice is needed.
+
+Prints throughput, p50/p95/p99 turn latency, time-to-first-token, report
+latency, memory per session and the per-stage histograms, so regressions in
+the hot path show up as numbers. A run that had to be repeated (an empty
+render, a dropped turn or click) counts as an error, and the retries are
+listed by kind:
+
+    python loadtest.py --sessions 20 --turns 5 --ttft 0.2 --tokens-per-second 200
+    python loadtest.py --sessions 50 --error-rate 0.1 --json results.json
+    python loadtest.py --sessions 100 --turns 3 --service --session-state
+"""
+
+import argparse
+import collections
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+PRACTICE_TURNS = [
+    "Hi! I'm feeling a bit nervous today.",
+    "p and b. Pah, bah.",
+    "s and sh. Sea, she.",
+    "k, like in cat. Kuh, cat.",
+    "I like drawing and playing football with my friends.",
+]
+
+
+def allow_concurrent_app_tests():
+    """Let several AppTest sessions run on threads of one process.
+
+    AppTest installs a mock Runtime singleton at the start of every run and
+    clears it at the end, so a run finishing on one thread would pull the
+    runtime out from under the others. Keep the first mock runtime for the life
+    of the process instead, as a real server keeps one runtime for all sessions.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test
+
+    class KeepFirstRuntime(type):
+        def __setattr__(cls, name, value):
+            if name == '_instance':
+                if Runtime._instance is None and value is not None:
+                    Runtime._instance = value
+                return
+            super().__setattr__(name, value)
+
+    class SharedRuntime(Runtime, metaclass=KeepFirstRuntime):
+        pass
+
+    app_test.Runtime = SharedRuntime
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def rss_bytes():
+    """Resident memory of this process (Linux), or None where it is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(process, port, name, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"{name} did not start")
+
+
+def start_mock(args):
+    """Run the Groq stand-in in its own process so it does not compete for our GIL."""
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_groq.py'),
+        '--port', str(port), '--ttft', str(args.ttft), '--tokens-per-second', str(args.tokens_per_second),
+        '--error-rate', str(args.error_rate), '--error-status', str(args.error_status),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    return process, wait_for_port(process, port, "Mock Groq server")
+
+
+def start_kv():
+    """Run the key-value stand-in for session state in its own process."""
+    port = free_port()
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_kv.py'),
+               '--port', str(port)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    return process, "redis" + wait_for_port(process, port, "Key-value stand-in")[len("http"):] + "/0"
+
+
+def start_service():
+    """Run the chat service in its own process, configured by the environment set up in main()."""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'chatbot.service', '--port', str(port)],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+    return process, wait_for_port(process, port, "Chat service", timeout=30)
+
+
+class SessionResult:
+    def __init__(self):
+        self.turn_latencies = []
+        self.ttfts = []
+        self.report_latency = None
+        self.errors = []
+        self.retries = collections.Counter()
+
+
+def ensure_rendered(app, result, attempts=3):
+    """Rerun until the chat input is on the page.
+
+    Under heavy concurrency AppTest occasionally hands back an empty element
+    tree for a run. That may be the harness or a run the app dropped, the two
+    look the same from here, so every rerun counts as a retry.
+    """
+    for _ in range(attempts):
+        if any(widget.key == "user_input_box" for widget in app.text_input):
+            return
+        result.retries["empty_render"] += 1
+        app.run()
+    raise RuntimeError("the chat input never rendered")
+
+
+def run_session(script, turns, report, report_timeout, result):
+    """Drive one headless session: initial render, typed turns, then a report."""
+    from streamlit.testing.v1 import AppTest
+
+    try:
+        app = AppTest.from_file(script, default_timeout=120).run()
+        for turn in range(turns):
+            message = PRACTICE_TURNS[turn % len(PRACTICE_TURNS)]
+            # Timed from the first attempt, so a dropped run shows up in the latency too
+            start_time = time.perf_counter()
+            while True:
+                ensure_rendered(app, result)
+                turns_before = len(app.session_state.turn_timings)
+                app.text_input(key="user_input_box").input(message).run()
+                if len(app.session_state.turn_timings) > turns_before:
+                    break
+                # The run was dropped before the turn was sent, send it again
+                result.retries["dropped_turn"] += 1
+            result.turn_latencies.append(time.perf_counter() - start_time)
+            result.errors.extend(str(e.value) for e in app.exception)
+        result.ttfts = [timing["time_to_first_token"] for timing in app.session_state.turn_timings]
+
+        if report:
+            # Clear the input first, otherwise the rerun would send the last turn again
+            ensure_rendered(app, result)
+            app.text_input(key="user_input_box").input("").run()
+            start_time = time.perf_counter()
+            while True:
+                ensure_rendered(app, result)
+                next(b for b in app.button if b.label == "Generate Report").click().run()
+                if app.session_state.report_job_id:
+                    break
+                # The click was dropped with the run, click again
+                result.retries["dropped_click"] += 1
+            while time.perf_counter() - start_time < report_timeout:
+                if app.success or app.error or app.exception:
+                    break
+                time.sleep(0.1)
+                app.run()
+            if app.success:
+                result.report_latency = time.perf_counter() - start_time
+            else:
+                result.errors.append("report did not finish")
+    except Exception as e:
+        result.errors.append(f"{type(e).__name__}: {e}")
+
+
+def summarize(results, elapsed, memory_per_session, args, service_url=None):
+    turn_latencies = [t for r in results for t in r.turn_latencies]
+    ttfts = [t for r in results for t in r.ttfts]
+    report_latencies = [r.report_latency for r in results if r.report_latency is not None]
+    retries = sum((r.retries for r in results), collections.Counter())
+    summary = {
+        "sessions": args.sessions,
+        "turns_per_session": args.turns,
+        "elapsed_s": elapsed,
+        "turns_completed": len(turn_latencies),
+        "throughput_turns_per_s": len(turn_latencies) / elapsed if elapsed else None,
+        "turn_latency_s": {f"p{q}": percentile(turn_latencies, q / 100) for q in (50, 95, 99)},
+        "ttft_s": {f"p{q}": percentile(ttfts, q / 100) for q in (50, 95, 99)},
+        "report_latency_s": {f"p{q}": percentile(report_latencies, q / 100) for q in (50, 95, 99)},
+        "memory_per_session_bytes": memory_per_session,
+        # Retried runs are failures the session recovered from, not successes
+        "errors": sum(len(r.errors) for r in results) + sum(retries.values()),
+        "retries": dict(retries),
+    }
+    if service_url:
+        # The LLM and report stages ran in the service, the audio ones here
+        with urllib.request.urlopen(f"{service_url}/stats") as response:
+            stats = json.load(response)
+        summary.update(stats)
+        from stage_metrics import get_metrics
+        summary["stages"] = dict(stats["stages"], **get_metrics().snapshot())
+        return summary
+    try:
+        from llm_gateway import get_gateway
+        gateway = get_gateway()
+        summary["gateway"] = gateway.resilience_metrics()
+        summary["completion_cache"] = gateway.cache_stats()
+        summary["side_usage"] = gateway.side_usage_stats()
+    except Exception:
+        pass
+    from stage_metrics import get_metrics
+    summary["stages"] = get_metrics().snapshot()
+    return summary
+
+
+def print_summary(summary, results):
+    def fmt(stats):
+        return "  ".join(f"{name}={value * 1000:.0f}ms" if value is not None else f"{name}=n/a"
+                         for name, value in stats.items())
+
+    print(f"Sessions: {summary['sessions']} x {summary['turns_per_session']} turns "
+          f"in {summary['elapsed_s']:.1f}s")
+    print(f"Throughput: {summary['throughput_turns_per_s']:.2f} turns/s")
+    print(f"Turn latency: {fmt(summary['turn_latency_s'])}")
+    print(f"Time to first token: {fmt(summary['ttft_s'])}")
+    print(f"Report latency: {fmt(summary['report_latency_s'])}")
+    if summary["memory_per_session_bytes"] is not None:
+        print(f"Memory per session: {summary['memory_per_session_bytes'] / 1024:.0f} KiB")
+    if "gateway" in summary:
+        print(f"Gateway: {summary['gateway']}  cache: {summary['completion_cache']}")
+        print(f"Side calls: {summary['side_usage']}")
+    if summary["stages"]:
+        print("Stages:")
+        for stage, stats in summary["stages"].items():
+            print(f"  {stage:<20} n={stats['count']:<5} {fmt({q: stats[q] for q in ('p50', 'p95', 'p99')})}")
+    retries = "  ".join(f"{kind}={count}" for kind, count in sorted(summary["retries"].items()))
+    print(f"Errors: {summary['errors']} (retried runs: {retries or 'none'})")
+    for error in sorted({e for r in results for e in r.errors})[:10]:
+        print(f"  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--script', default='app.py', help="entry script to drive")
+    parser.add_argument('--sessions', type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument('--turns', type=int, default=5, help="typed turns per session")
+    parser.add_argument('--no-report', action='store_true', help="skip report generation")
+    parser.add_argument('--report-timeout', type=float, default=120.0)
+    parser.add_argument('--ttft', type=float, default=0.2, help="mock time to first token (s)")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help="mock token rate")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of mock requests that fail")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--base-url', help="use an already running Groq stand-in instead of starting one")
+    parser.add_argument('--service', action='store_true', help="drive the sessions as clients of a chat service")
+    parser.add_argument('--session-state', action='store_true', help="keep session state in the key-value stand-in")
+    parser.add_argument('--json', help="also write the summary to this file")
+    args = parser.parse_args()
+
+    mock = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        mock, base_url = start_mock(args)
+    os.environ['GROQ_BASE_URL'] = base_url
+    os.environ['GROQ_API_KEY'] = 'mock'
+    os.environ['TTS_DRIVER'] = 'silence'
+    # Keep the simulated conversations out of the real conversation store
+    os.environ['CONVERSATION_DB'] = os.path.join(tempfile.mkdtemp(prefix='loadtest_'), 'conversations.db')
+
+    service, service_url, kv = None, None, None
+    allow_concurrent_app_tests()
+    try:
+        if args.session_state:
+            kv, os.environ['SESSION_STATE_URL'] = start_kv()
+        if args.service:
+            service, service_url = start_service()
+            os.environ['CHAT_SERVICE_URL'] = service_url
+        # Warm-up session so one-off process start-up cost is not charged to the sessions
+        run_session(args.script, 1, False, args.report_timeout, SessionResult())
+
+        results = [SessionResult() for _ in range(args.sessions)]
+        threads = [
+            threading.Thread(target=run_session,
+                             args=(args.script, args.turns, not args.no_report, args.report_timeout, result))
+            for result in results
+        ]
+        rss_before = rss_bytes()
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start_time
+        rss_after = rss_bytes()
+        memory_per_session = None
+        if rss_before is not None and rss_after is not None:
+            memory_per_session = max(0, rss_after - rss_before) / args.sessions
+
+        summary = summarize(results, elapsed, memory_per_session, args, service_url)
+        print_summary(summary, results)
+        if args.json:
+            with open(args.json, 'w') as json_file:
+                json.dump(summary, json_file, indent=2)
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+        if kv is not None:
+            kv.terminate()
+        if mock is not None:
+            mock.terminate()
+
+
+if __name__ == '__main__':
+    main()
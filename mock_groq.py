@@ -0,0 +1,204 @@
+"""Local stand-in for the Groq chat completions endpoint.
+
+Serves POST /openai/v1/chat/completions in the OpenAI/Groq wire format, both
+streamed (server-sent events) and plain JSON, with a configurable reply,
+time-to-first-token and token rate. Faults can be injected to exercise the
+gateway's retries, hedging and circuit breaker: a share of requests can fail
+with a given status (and Retry-After header) or be slow to the first token.
+Run it and point the app at it:
+
+    python mock_groq.py --port 8765 --error-rate 0.2 --error-status 429 --retry-after 1
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=mock streamlit run app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "That's wonderful to hear! Let's practice a few sounds together. "
+    "Can you say 'p' and 'b' for me? Take your time, you're doing great."
+)
+
+
+class MockConfig:
+    """Behaviour of the mock endpoint, shared by all request handlers."""
+
+    def __init__(self, reply=DEFAULT_REPLY, ttft=0.2, tokens_per_second=200.0, error_rate=0.0,
+                 error_status=503, retry_after=None, slow_rate=0.0, slow_ttft=5.0, seed=None):
+        self.reply = reply
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_ttft = slow_ttft
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.slow = 0
+        self.lock = threading.Lock()
+
+    def draw_fault(self):
+        """Decide what happens to the next request: "error", "slow" or None."""
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return "error"
+            if roll < self.error_rate + self.slow_rate:
+                self.slow += 1
+                return "slow"
+        return None
+
+
+def split_tokens(text):
+    """Split text into word-sized pieces that keep their trailing whitespace."""
+    tokens = []
+    for word in text.split(" "):
+        tokens.append(word + " ")
+    tokens[-1] = tokens[-1].rstrip(" ")
+    return tokens
+
+
+def chunk_payload(completion_id, model, content=None, finish_reason=None):
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, payload):
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        event = f"data: {data}\n\n".encode('utf-8')
+        self.wfile.write(f"{len(event):x}\r\n".encode('ascii') + event + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.respond(request, self.config.draw_fault())
+
+    def respond(self, request, fault=None):
+        config = self.config
+        if fault == "error":
+            headers = {"retry-after": str(config.retry_after)} if config.retry_after is not None else None
+            self._send_json(config.error_status, {
+                "error": {"message": "Injected fault", "type": "mock_error", "code": config.error_status},
+            }, headers)
+            return
+
+        model = request.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        tokens = split_tokens(config.reply)
+        max_tokens = request.get("max_tokens")
+        if max_tokens:
+            tokens = tokens[:max_tokens]
+        delay = 1.0 / config.tokens_per_second if config.tokens_per_second else 0
+
+        time.sleep(config.slow_ttft if fault == "slow" else config.ttft)
+        if not request.get("stream"):
+            time.sleep(delay * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                self._send_event(chunk_payload(completion_id, model, content=token))
+                time.sleep(delay)
+            self._send_event(chunk_payload(completion_id, model, finish_reason="stop"))
+            self._send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request mid-stream
+            self.close_connection = True
+
+
+def make_server(host="127.0.0.1", port=0, config=None):
+    """Build a mock server (port 0 picks a free port); call serve_forever() to run it."""
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"config": config or MockConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(config=None, host="127.0.0.1", port=0):
+    """Start a mock server on a background thread and return (server, base_url)."""
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Groq chat completions API.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--reply', default=DEFAULT_REPLY, help="text every completion returns")
+    parser.add_argument('--ttft', type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument('--error-status', type=int, default=503, help="HTTP status of failed requests")
+    parser.add_argument('--retry-after', type=float, default=None, help="Retry-After seconds sent with failures")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="share of requests with a slow first token")
+    parser.add_argument('--slow-ttft', type=float, default=5.0, help="seconds before the first token when slow")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(args.reply, args.ttft, args.tokens_per_second, args.error_rate, args.error_status,
+                        args.retry_after, args.slow_rate, args.slow_ttft, args.seed)
+    server = make_server(args.host, args.port, config)
+    print(f"Mock Groq API on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
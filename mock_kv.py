@@ -0,0 +1,217 @@
+"""Local stand-in for the Redis server that keeps session state.
+
+Speaks enough of the Redis protocol (RESP2) for RedisSessionState: GET, SET
+with EX/PX/NX/XX, DEL, EXISTS, PTTL, WATCH/UNWATCH, MULTI/EXEC/DISCARD, PING,
+AUTH, SELECT and FLUSHDB. Keys expire like in Redis, and a transaction fails
+when a watched key was written after WATCH, so optimistic concurrency behaves
+as it does against the real thing. Run it and point the app at it:
+
+    python mock_kv.py --port 6380
+    SESSION_STATE_URL=redis://127.0.0.1:6380/0 streamlit run app.py
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+class KeyValueData:
+    """Keys, their expiry and a write counter per key, shared by all connections."""
+
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+        self.writes = {}
+        self.lock = threading.Lock()
+
+    def alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+            self._touch(key)
+        return key in self.values
+
+    def _touch(self, key):
+        self.writes[key] = self.writes.get(key, 0) + 1
+
+    def set(self, key, value, ttl=None):
+        self.values[key] = value
+        if ttl is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ttl
+        self._touch(key)
+
+    def delete(self, key):
+        existed = self.alive(key)
+        self.values.pop(key, None)
+        self.expires.pop(key, None)
+        if existed:
+            self._touch(key)
+        return existed
+
+
+class Error(Exception):
+    pass
+
+
+def encode_reply(reply):
+    if isinstance(reply, Error):
+        return b"-ERR " + str(reply).encode('utf-8') + b"\r\n"
+    if reply is True:
+        return b"+OK\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode('utf-8') + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n" % len(reply) + reply + b"\r\n"
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item) for item in reply)
+    return b"$-1\r\n"
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    data = None
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        self.watched = {}
+        self.queued = None
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            try:
+                reply = self.dispatch(args[0].upper().decode('ascii'), args[1:])
+            except (ValueError, IndexError):
+                reply = Error("syntax error")
+            except Error as e:
+                reply = e
+            self.wfile.write(encode_reply(reply))
+
+    def dispatch(self, name, args):
+        if self.queued is not None and name not in ("EXEC", "DISCARD", "MULTI", "WATCH"):
+            self.queued.append((name, args))
+            return "QUEUED"
+        if name == "MULTI":
+            if self.queued is not None:
+                raise Error("MULTI calls can not be nested")
+            self.queued = []
+            return True
+        if name == "DISCARD":
+            self.queued = None
+            self.watched = {}
+            return True
+        if name == "EXEC":
+            if self.queued is None:
+                raise Error("EXEC without MULTI")
+            queued, self.queued = self.queued, None
+            with self.data.lock:
+                for key, writes in self.watched.items():
+                    self.data.alive(key)
+                    if self.data.writes.get(key, 0) != writes:
+                        self.watched = {}
+                        return None
+                self.watched = {}
+                replies = []
+                for name, args in queued:
+                    try:
+                        replies.append(self.run(name, args))
+                    except Error as e:
+                        replies.append(e)
+                return replies
+        if name == "WATCH":
+            if self.queued is not None:
+                raise Error("WATCH inside MULTI is not allowed")
+            with self.data.lock:
+                for key in args:
+                    self.data.alive(key)
+                    self.watched.setdefault(key, self.data.writes.get(key, 0))
+            return True
+        if name == "UNWATCH":
+            self.watched = {}
+            return True
+        with self.data.lock:
+            return self.run(name, args)
+
+    def run(self, name, args):
+        """Run a data command; the caller holds the data lock."""
+        data = self.data
+        if name == "PING":
+            return args[0] if args else "PONG"
+        if name in ("AUTH", "SELECT"):
+            return True
+        if name == "GET":
+            return data.values[args[0]] if data.alive(args[0]) else None
+        if name == "SET":
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            ttl = None
+            if b"EX" in options:
+                ttl = int(args[2 + options.index(b"EX") + 1])
+            if b"PX" in options:
+                ttl = int(args[2 + options.index(b"PX") + 1]) / 1000
+            exists = data.alive(key)
+            if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                return None
+            data.set(key, value, ttl)
+            return True
+        if name == "DEL":
+            return sum(data.delete(key) for key in args)
+        if name == "EXISTS":
+            return sum(data.alive(key) for key in args)
+        if name == "PTTL":
+            if not data.alive(args[0]):
+                return -2
+            expires = data.expires.get(args[0])
+            return -1 if expires is None else int((expires - time.monotonic()) * 1000)
+        if name == "FLUSHDB":
+            for key in list(data.values):
+                data.delete(key)
+            return True
+        raise Error(f"unknown command '{name}'")
+
+
+class KeyValueServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def make_server(host="127.0.0.1", port=0, data=None):
+    """Build a stand-in server (port 0 picks a free port); call serve_forever() to run it."""
+    handler = type("ConfiguredRespHandler", (RespHandler,), {"data": data or KeyValueData()})
+    return KeyValueServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Redis session-state server.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port)
+    print(f"Mock key-value server on redis://{args.host}:{server.server_address[1]}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
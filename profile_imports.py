@@ -0,0 +1,101 @@
+"""Measure the import-time (cold start) cost of the app entry points.
+
+Streamlit re-executes the entry script on every interaction, and a cold start
+pays for every module the script imports at top level. This runs those imports
+in a fresh interpreter with `python -X importtime` and prints a per-module
+breakdown, so cold-start time can be tracked as a number.
+
+Usage:
+    python profile_imports.py app.py "Conversational AI.py"
+    python profile_imports.py app.py --top 30
+    python profile_imports.py report reportlab.platypus   # modules work too
+"""
+
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def top_level_imports(script_path):
+    """Return the source of the import statements a script runs at module level."""
+    with open(script_path, encoding='utf-8') as script_file:
+        tree = ast.parse(script_file.read(), filename=script_path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def run_importtime(statements, cwd):
+    """Run import statements in a fresh interpreter and parse the -X importtime report."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', "\n".join(statements)],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Import failed: {result.stderr.strip().splitlines()[-1]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "name": name,
+                "depth": len(indent) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+    return modules
+
+
+def startup_modules():
+    """Modules the interpreter imports before running any code, excluded from the report."""
+    return {m["name"] for m in run_importtime(["pass"], os.getcwd())}
+
+
+def print_report(target, modules, top):
+    # Depth 0 entries are the modules imported directly by the statements
+    direct = sorted((m for m in modules if m["depth"] == 0), key=lambda m: -m["cumulative_ms"])
+    heaviest = sorted(modules, key=lambda m: -m["self_ms"])[:top]
+    total_ms = sum(m["cumulative_ms"] for m in direct)
+
+    print(f"== {target}: {total_ms:.1f} ms total import time, {len(modules)} modules")
+    print("\nTop-level imports (cumulative):")
+    for m in direct:
+        print(f"  {m['cumulative_ms']:9.1f} ms  {m['name']}")
+    print(f"\nHeaviest modules (self time, top {top}):")
+    for m in heaviest:
+        print(f"  {m['self_ms']:9.1f} ms  {m['name']}")
+    print()
+    return total_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('targets', nargs='+', help="entry scripts (.py) or module names")
+    parser.add_argument('--top', type=int, default=15, help="number of heaviest modules to list")
+    args = parser.parse_args()
+
+    baseline = startup_modules()
+    totals = {}
+    for target in args.targets:
+        if target.endswith('.py'):
+            cwd = os.path.dirname(os.path.abspath(target))
+            statements = top_level_imports(target)
+        else:
+            cwd = os.getcwd()
+            statements = [f"import {target}"]
+        modules = [m for m in run_importtime(statements, cwd) if m["name"] not in baseline]
+        totals[target] = print_report(target, modules, args.top)
+
+    if len(totals) > 1:
+        print("Summary:")
+        for target, total_ms in totals.items():
+            print(f"  {total_ms:9.1f} ms  {target}")
+
+
+if __name__ == '__main__':
+    main()
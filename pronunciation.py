@@ -0,0 +1,256 @@
+"""Phoneme-level pronunciation scoring.
+
+The user's recording is turned into MFCC features and each practised phoneme's
+reference templates are searched for inside it with subsequence dynamic time
+warping (the template may match anywhere in the utterance, e.g. the "p" in
+"p and b"). All templates of a request are aligned at once: their cost
+matrices are stacked into one array and the DTW recursion runs over
+anti-diagonals, so every step is a vectorised NumPy operation over all
+templates and cells of a diagonal.
+
+Templates live in a feature store on disk: the features of every template
+concatenated into one float32 file that is memory-mapped read-only, plus a
+JSON index. Processes and sessions share the mapped pages instead of each
+loading their own copy. Build a store from reference recordings laid out as
+<dir>/<phoneme>/*.wav:
+
+    python pronunciation.py build reference_recordings/ pronunciation_templates/
+
+A score of 100 means the attempt is as close to the references as they are to
+each other; it falls off as the distance grows beyond that.
+"""
+
+import argparse
+import functools
+import json
+import os
+import re
+
+import numpy as np
+
+PRACTICE_PHONEMES = ("p", "b", "s", "sh", "k")
+
+SAMPLE_RATE = 16000
+N_MFCC = 13
+# Coefficients kept per frame, c0 (energy) is dropped
+N_FEATURES = N_MFCC - 1
+N_MELS = 26
+N_FFT = 512
+FRAME_SECONDS = 0.025
+HOP_SECONDS = 0.01
+
+# Fallback reference distance for phonemes with a single template
+DEFAULT_REFERENCE_DISTANCE = 3.0
+
+# Phonemes the bot asks for in quotes, e.g. "Can you say 'p' and 'b' for me?"
+ASKED_PHONEME = re.compile(r"'(sh|p|b|s|k)'")
+
+
+@functools.lru_cache(maxsize=None)
+def mel_filterbank(rate=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    """Triangular mel filters as a (n_mels, n_fft // 2 + 1) matrix."""
+    def hz_to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    def mel_to_hz(mel):
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    mel_points = np.linspace(hz_to_mel(0), hz_to_mel(rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / rate).astype(int)
+    columns = np.arange(n_fft // 2 + 1)
+    left, center, right = bins[:-2, None], bins[1:-1, None], bins[2:, None]
+    rising = (columns - left) / np.maximum(center - left, 1)
+    falling = (right - columns) / np.maximum(right - center, 1)
+    return np.clip(np.minimum(rising, falling), 0, None).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def dct_matrix(n_mfcc=N_MFCC, n_mels=N_MELS):
+    """Orthonormal DCT-II rows that turn log mel energies into cepstral coefficients."""
+    k = np.arange(n_mfcc)[:, None]
+    n = np.arange(n_mels)[None, :]
+    matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2 / n_mels)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+def mfcc(samples, rate=SAMPLE_RATE):
+    """MFCC frames (frames, N_FEATURES) of float samples, without the energy coefficient."""
+    samples = np.asarray(samples, dtype=np.float32)
+    frame_length = int(FRAME_SECONDS * rate)
+    hop = int(HOP_SECONDS * rate)
+    if samples.size < frame_length:
+        samples = np.pad(samples, (0, frame_length - samples.size))
+    emphasized = np.append(samples[:1], samples[1:] - 0.97 * samples[:-1])
+    frames = np.lib.stride_tricks.sliding_window_view(emphasized, frame_length)[::hop]
+    power = np.abs(np.fft.rfft(frames * np.hamming(frame_length), N_FFT)) ** 2 / N_FFT
+    log_mel = np.log(power @ mel_filterbank(rate).T + 1e-10)
+    # c0 is overall energy, leave it out so loudness does not count as pronunciation
+    return (log_mel @ dct_matrix().T)[:, 1:].astype(np.float32)
+
+
+def pcm_features(pcm, rate=SAMPLE_RATE):
+    """MFCC frames of 16-bit mono PCM bytes at any sample rate."""
+    samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768
+    if rate != SAMPLE_RATE:
+        from audio_preprocess import resample
+        samples = resample(samples, rate, SAMPLE_RATE)
+    return mfcc(samples)
+
+
+def subsequence_dtw(templates, lengths, query):
+    """Length-normalised distance of each template's best match anywhere inside the query.
+
+    `templates` is (batch, max frames, features) padded past each template's
+    length, `lengths` the real lengths, `query` (frames, features).
+    """
+    batch, rows, _ = templates.shape
+    columns = query.shape[0]
+    # Euclidean frame distances for every template at once: (batch, rows, columns)
+    squared = ((templates ** 2).sum(axis=2)[:, :, None] + (query ** 2).sum(axis=1)[None, None, :]
+               - 2 * templates @ query.T)
+    cost = np.sqrt(np.clip(squared, 0, None))
+    cost[np.arange(rows)[None, :] >= lengths[:, None]] = np.inf
+
+    # D[i, j] = cost[i, j] + min(D[i-1, j], D[i, j-1], D[i-1, j-1]); the first
+    # template row may start at any query frame. Cells on one anti-diagonal only
+    # depend on the two before it, so each diagonal is computed in one step.
+    total = np.full((batch, rows, columns), np.inf, dtype=np.float32)
+    for diagonal in range(rows + columns - 1):
+        i = np.arange(max(0, diagonal - columns + 1), min(diagonal, rows - 1) + 1)
+        j = diagonal - i
+        best = np.full((batch, i.size), np.inf, dtype=np.float32)
+        has_up = i > 0
+        has_left = j > 0
+        best[:, ~has_up] = 0.0
+        best[:, has_up] = np.minimum(best[:, has_up], total[:, i[has_up] - 1, j[has_up]])
+        best[:, has_left] = np.minimum(best[:, has_left], total[:, i[has_left], j[has_left] - 1])
+        both = has_up & has_left
+        best[:, both] = np.minimum(best[:, both], total[:, i[both] - 1, j[both] - 1])
+        total[:, i, j] = cost[:, i, j] + best
+
+    ends = total[np.arange(batch), lengths - 1, :].min(axis=1)
+    return ends / lengths
+
+
+def asked_phonemes(text):
+    """Phonemes the bot asked the user to practise in a message, in order."""
+    return list(dict.fromkeys(ASKED_PHONEME.findall(text or "")))
+
+
+class TemplateStore:
+    """Reference templates memory-mapped from a feature store directory."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'index.json')) as index_file:
+            index = json.load(index_file)
+        self.n_features = index["n_features"]
+        self.templates = index["templates"]
+        self.reference_distance = index.get("reference_distance", {})
+        self.features = np.memmap(os.path.join(path, 'features.f32'), dtype='<f4', mode='r').reshape(-1, self.n_features)
+        self.phonemes = sorted({template["phoneme"] for template in self.templates})
+
+    def batch(self, phonemes):
+        """Padded (templates, max frames, features) array, lengths and phoneme of each row."""
+        selected = [template for template in self.templates if template["phoneme"] in phonemes]
+        lengths = np.array([template["frames"] for template in selected], dtype=int)
+        padded = np.zeros((len(selected), lengths.max() if selected else 0, self.n_features), dtype=np.float32)
+        for row, template in enumerate(selected):
+            padded[row, :template["frames"]] = self.features[template["offset"]:template["offset"] + template["frames"]]
+        return padded, lengths, [template["phoneme"] for template in selected]
+
+
+def build_store(path, recordings):
+    """Write a feature store from (phoneme, 16 kHz float samples) pairs."""
+    os.makedirs(path, exist_ok=True)
+    templates = []
+    features = []
+    offset = 0
+    for phoneme, samples in recordings:
+        template = mfcc(samples)
+        templates.append({"phoneme": phoneme, "offset": offset, "frames": len(template)})
+        features.append(template)
+        offset += len(template)
+    np.concatenate(features).astype('<f4').tofile(os.path.join(path, 'features.f32'))
+
+    # How far apart the references of a phoneme are from each other sets its scale
+    reference_distance = {}
+    for phoneme in sorted({template["phoneme"] for template in templates}):
+        rows = [n for n, template in enumerate(templates) if template["phoneme"] == phoneme]
+        distances = []
+        for query_row in rows:
+            others = [features[n] for n in rows if n != query_row]
+            if others:
+                lengths = np.array([len(other) for other in others])
+                padded = np.zeros((len(others), lengths.max(), N_FEATURES), dtype=np.float32)
+                for n, other in enumerate(others):
+                    padded[n, :len(other)] = other
+                distances.extend(subsequence_dtw(padded, lengths, features[query_row]))
+        if distances:
+            reference_distance[phoneme] = float(np.median(distances))
+
+    with open(os.path.join(path, 'index.json'), 'w') as index_file:
+        json.dump({"n_features": N_FEATURES, "sample_rate": SAMPLE_RATE, "templates": templates,
+                   "reference_distance": reference_distance}, index_file, indent=1)
+
+
+class PronunciationScorer:
+    """Scores recordings against the reference templates of each phoneme."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def score_features(self, features, phonemes=None):
+        phonemes = [p for p in (phonemes or self.store.phonemes) if p in self.store.phonemes]
+        if not phonemes or len(features) == 0:
+            return {}
+        templates, lengths, template_phonemes = self.store.batch(phonemes)
+        distances = subsequence_dtw(templates, lengths, features)
+        scores = {}
+        for phoneme in phonemes:
+            # The closest reference of the phoneme counts
+            distance = min(d for d, p in zip(distances, template_phonemes) if p == phoneme)
+            reference = self.store.reference_distance.get(phoneme, DEFAULT_REFERENCE_DISTANCE)
+            scores[phoneme] = float(100 * np.exp(-max(0.0, distance - reference) / reference))
+        return scores
+
+    def score(self, pcm, rate=SAMPLE_RATE, phonemes=None):
+        """Score 16-bit mono PCM bytes; returns {phoneme: 0-100}."""
+        return self.score_features(pcm_features(pcm, rate), phonemes)
+
+    def score_batch(self, recordings, phonemes=None):
+        """Score a session's (pcm, rate) recordings; returns {phoneme: [scores]} over all of them."""
+        results = {}
+        for pcm, rate in recordings:
+            for phoneme, score in self.score(pcm, rate, phonemes).items():
+                results.setdefault(phoneme, []).append(score)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the pronunciation template store.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="build a store from <dir>/<phoneme>/* recordings")
+    build.add_argument('recordings', help="directory with one subdirectory of recordings per phoneme")
+    build.add_argument('store', help="output directory of the feature store")
+    args = parser.parse_args()
+
+    from audio_preprocess import preprocess
+    recordings = []
+    for phoneme in sorted(os.listdir(args.recordings)):
+        phoneme_dir = os.path.join(args.recordings, phoneme)
+        if not os.path.isdir(phoneme_dir):
+            continue
+        for name in sorted(os.listdir(phoneme_dir)):
+            with open(os.path.join(phoneme_dir, name), 'rb') as audio_file:
+                # References go through the same preprocessing as the users' recordings
+                pcm = preprocess(audio_file.read(), name)
+            recordings.append((phoneme, np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768))
+    if not recordings:
+        raise SystemExit(f"No recordings found under {args.recordings}")
+    build_store(args.store, recordings)
+    print(f"Stored {len(recordings)} templates for {len({p for p, _ in recordings})} phonemes in {args.store}")
+
+
+if __name__ == '__main__':
+    main()
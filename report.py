@@ -0,0 +1,277 @@
+"""PDF analysis report for a conversation.
+
+The ReportLab/matplotlib stack is imported inside
+generate_analysis_report, so importing this module is cheap and the entry
+scripts only pay for that stack when a report is actually generated.
+"""
+
+import io
+
+from report_analysis import analyze_conversation
+from report_assets import asset_image
+from stage_metrics import REPORT_ANALYSIS, REPORT_CHART_RENDER, REPORT_PDF_BUILD, REPORT_PRONUNCIATION, span
+
+HEADER_TEXT = "ARTICULATEIQ - Conversational AI"
+
+
+def render_progress_chart(weekly_progress):
+    """PNG of the weekly scores, with the turns of each week as bars, in an in-memory buffer."""
+    from matplotlib.figure import Figure
+
+    weeks = range(len(weekly_progress))
+    # Draw on a standalone Figure, pyplot's global state is not safe across report threads
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    turns_ax = ax.twinx()
+    turns_ax.bar(weeks, [row['user_turns'] for row in weekly_progress], color='#1F4E79', alpha=0.15, label='Turns')
+    turns_ax.set_ylabel('Turns')
+    for label, key, scale in (('Pronunciation', 'pronunciation', 1), ('Recognition confidence', 'confidence', 100)):
+        points = [(week, row[key] * scale) for week, row in zip(weeks, weekly_progress) if row[key] is not None]
+        if points:
+            ax.plot(*zip(*points), marker='o', label=label)
+    # Keep the score lines in front of the bars
+    ax.set_zorder(turns_ax.get_zorder() + 1)
+    ax.patch.set_visible(False)
+    ax.set_ylim(0, 100)
+    ax.set_title('Progress Over Time')
+    ax.set_ylabel('Percentage')
+    ax.set_xlabel('Week of')
+    ax.set_xticks(list(weeks), [row['week'] for row in weekly_progress])
+    ax.grid(True)
+    lines, labels = ax.get_legend_handles_labels()
+    bars, bar_labels = turns_ax.get_legend_handles_labels()
+    ax.legend(lines + bars, labels + bar_labels, loc='lower right')
+    fig.tight_layout()
+    chart_buffer = io.BytesIO()
+    fig.savefig(chart_buffer, format='png')
+    chart_buffer.seek(0)
+    return chart_buffer
+
+
+def generate_analysis_report(conversation_history, complete, header_text=HEADER_TEXT, progress=None,
+                             score_pronunciation=None, weekly_progress=None):
+    """Generate a well-formatted PDF report based on the conversation history.
+
+    `complete(prompt)` returns the model's text; long conversations are analysed
+    in chunks, so it may be called several times and from several threads.
+    `progress(stage)` is called as the report moves through the analysis,
+    pronunciation, charts, layout and build stages. `score_pronunciation()`, when given, batch-scores
+    the session's recordings and returns {phoneme: [scores]}. `weekly_progress`
+    is the session's rows from ConversationStore.weekly_progress, charted and
+    tabulated under "Progress Over Time".
+    """
+    if progress is None:
+        progress = lambda stage: None
+
+    # The report stack is only loaded on first use
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+
+    user_responses = [msg['content'] for msg in conversation_history if msg['role'] == 'user']
+
+    try:
+        progress("analysis")
+        with span(REPORT_ANALYSIS):
+            response_text = analyze_conversation(conversation_history, complete)
+
+        if not response_text.strip():
+            raise ValueError("The generated response is empty. Check the API response or prompt.")
+
+        pronunciation_scores = {}
+        if score_pronunciation is not None:
+            progress("pronunciation")
+            with span(REPORT_PRONUNCIATION):
+                pronunciation_scores = score_pronunciation()
+
+        progress("charts")
+
+        chart_buffer = None
+        if weekly_progress:
+            with span(REPORT_CHART_RENDER):
+                chart_buffer = render_progress_chart(weekly_progress)
+
+        progress("layout")
+
+        # Create a PDF document
+        pdf_filename = "analysis_report.pdf"
+        styles = getSampleStyleSheet()
+
+        # Custom style for the header text
+        header_style = ParagraphStyle(
+            name='HeaderStyle',
+            fontSize=28,
+            leading=32,
+            textColor=colors.HexColor("#1F4E79"),
+            alignment=1,  # Center alignment
+            spaceAfter=20,
+            fontName='Helvetica-BoldOblique',
+            backColor=colors.lightblue
+        )
+
+        story = []
+
+        # Insert the pre-rendered logo at the top
+        story.append(asset_image('logo'))
+        story.append(Spacer(1, 12))
+
+        # Add the header
+        story.append(Paragraph(header_text, header_style))
+        story.append(Spacer(1, 12))
+        # Add a title
+        title = "User Details Summary"
+        title_style = ParagraphStyle(
+            name='TitleStyle',
+            fontSize=22,
+            leading=26,
+            textColor=colors.HexColor("#1F4E79"),
+            alignment=1,
+            fontName='Helvetica-Bold'
+        )
+        story.append(Paragraph(title, title_style))
+        story.append(Spacer(1, 12))
+
+        # Subtitle for Patient Demographics
+        subtitle_style = ParagraphStyle(
+            name='SubtitleStyle',
+            fontSize=18,
+            leading=22,
+            textColor=colors.HexColor("#1F4E79"),
+            fontName='Helvetica-Bold'
+        )
+        story.append(Paragraph("User Demographics", subtitle_style))
+
+        # Adding a table with patient details
+        patient_data = [
+            ['Name', 'Celeste Lim'],
+            ['Gender', 'Female'],
+            ['Location', 'St Rita Ward'],
+            ['ID No.', '1234565'],
+            ['Date of Birth', 'March 9, 2015'],
+            ['Nationality', 'Filipino'],
+            ['Visit No.', '2021-9-9-022'],
+            ['Age', '7 y, 8 mos'],
+            ['Race', 'Chinese']
+        ]
+
+        patient_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+        patient_table = Table(patient_data, style=patient_table_style)
+        story.append(patient_table)
+        story.append(Spacer(1, 12))
+
+        # Subtitle for Medical / Surgical / Family History
+        story.append(Paragraph("Conversation Analysis Insights ", subtitle_style))
+        medical_history_text = "Medical Consultancy needed: N.A."
+        story.append(Paragraph(medical_history_text, styles['BodyText']))
+        story.append(Spacer(1, 12))
+
+        # Adding another table for Admission details
+        admission_data = [
+            ['Interaction Date / Time', 'September 8, 2021 / 22:00H'],
+            ['User Name', 'John Doe'],
+            ['Reason for Interaction', 'Seeking support for neurodiversity and confidence issues'],
+            ['Primary Concern', 'Autism Spectrum Disorder'],
+            ['Secondary Concern', 'Generalized Anxiety Disorder'],
+            ['Other Concerns', 'Low self-esteem, Social anxiety'],
+            ['Goals', 'Improve confidence, Enhance social skills, Manage anxiety']
+        ]
+
+        admission_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+        admission_table = Table(admission_data, style=admission_table_style)
+        story.append(admission_table)
+        story.append(Spacer(1, 12))
+
+        # Pronunciation scores of the session's recordings, per practised phoneme
+        if pronunciation_scores:
+            story.append(Paragraph("Pronunciation Scores", subtitle_style))
+            pronunciation_data = [['Phoneme', 'Attempts', 'Average', 'Best']]
+            for phoneme, scores in sorted(pronunciation_scores.items()):
+                pronunciation_data.append([
+                    f"'{phoneme}'", len(scores), f"{sum(scores) / len(scores):.0f}/100", f"{max(scores):.0f}/100",
+                ])
+            story.append(Table(pronunciation_data, style=patient_table_style))
+            story.append(Spacer(1, 12))
+
+                # Add the generated analysis text
+        
+
+        # Define a bold style for headings
+        heading_style = ParagraphStyle(name="HeadingStyle", fontSize=14, leading=16, spaceAfter=12, textColor=HexColor("#000000"), fontName="Helvetica-Bold")
+
+        # Add the generated analysis text
+        response_text_cleaned = response_text.replace('*', '')  # Remove asterisks
+        analysis_paragraphs = response_text_cleaned.strip().split('\n')
+        formatted_analysis = []
+
+        for paragraph in analysis_paragraphs:
+            if paragraph.strip():
+                # Check if the paragraph is a heading (ends with a colon)
+                if paragraph.strip().endswith(':'):
+                    formatted_analysis.append(Paragraph(paragraph.strip(), heading_style))
+                else:
+                    formatted_analysis.append(Paragraph(paragraph.strip(), styles['BodyText']))
+                formatted_analysis.append(Spacer(1, 12))
+
+        story.extend(formatted_analysis)
+
+        # Add charts and illustrations
+        if weekly_progress:
+            story.append(Paragraph("Progress Over Time", heading_style))
+            story.append(Image(chart_buffer, width=6*inch, height=3*inch))
+            story.append(Spacer(1, 12))
+            progress_data = [['Week of', 'Turns', 'Phonemes', 'Pronunciation', 'Recognition', 'Reply time']]
+            for row in weekly_progress:
+                progress_data.append([
+                    row['week'], row['user_turns'], row['phonemes_practised'],
+                    f"{row['pronunciation']:.0f}/100" if row['pronunciation'] is not None else "-",
+                    f"{row['confidence'] * 100:.0f}%" if row['confidence'] is not None else "-",
+                    f"{row['reply_latency']:.1f}s" if row['reply_latency'] is not None else "-",
+                ])
+            story.append(Table(progress_data, style=patient_table_style))
+            story.append(Spacer(1, 12))
+
+        # Add a heading for the flowchart
+        flowchart_heading = Paragraph("The Four Level Analysis", heading_style)
+        story.append(flowchart_heading)
+        story.append(Spacer(1, 12))
+
+        # Add the pre-rendered flowchart image
+        story.append(asset_image('flowchart'))
+        story.append(Spacer(1, 12))
+
+        # Build the PDF
+        progress("build")
+        with span(REPORT_PDF_BUILD):
+            buffer = io.BytesIO()
+            doc = SimpleDocTemplate(buffer, pagesize=letter)
+            doc.build(story)
+
+        buffer.seek(0)
+        pdf_data = buffer.read()
+        
+        return pdf_data, pdf_filename
+
+    except Exception as e:
+        print(f"Error generating report: {e}")
+        raise
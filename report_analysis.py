@@ -0,0 +1,120 @@
+"""Map-reduce analysis of long conversations for the PDF report.
+
+A conversation that fits in one prompt is analysed with a single completion.
+A longer one is split into token-bounded chunks of whole turns, every chunk
+is summarised on a small shared thread pool (so no more than MAX_CONCURRENCY
+summaries are in flight per process), and the summaries are reduced into the
+final report sections with one more completion. When the summaries
+themselves are too long for one prompt they are reduced in groups first.
+
+Chunks are cut greedily from the start of the conversation, so new turns only
+change the last chunk. Chunk summaries are cached by a hash of the chunk's
+text, and regenerating a report after a few more turns only summarises the
+chunks that changed.
+"""
+
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from completion_cache import CompletionCache
+from context_window import estimate_tokens
+from llm_resilience import CANNED_RESPONSE
+
+# Transcript tokens per chunk, well inside the model context with the instructions and the reply
+CHUNK_TOKENS = 1500
+MAX_CONCURRENCY = 4
+
+REPORT_INSTRUCTIONS = (
+    "Based on the following conversation, generate a detailed report focusing on the user's behavior, "
+    "phoneme practice, confidence-building progress, and learning strategies. Please avoid filler text like asterisks (*). "
+)
+
+# The chunk's position is deliberately left out, so its summary stays cached when turns are added
+CHUNK_INSTRUCTIONS = (
+    "The following is part of a conversation between a pronunciation and confidence-building chatbot and a user. "
+    "Summarise it in a few sentences: the user's behavior, the phonemes practised and how they went, signs of "
+    "confidence or anxiety, and learning strategies that helped. Be factual and avoid asterisks (*). "
+    "\n\nConversation:\n"
+)
+
+COMBINE_INSTRUCTIONS = (
+    "The following are notes on consecutive parts of a conversation between a pronunciation and "
+    "confidence-building chatbot and a user. Merge them into one set of notes in a few sentences, "
+    "keeping every observation about the user. Avoid asterisks (*). "
+    "\n\nNotes:\n"
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+_summaries = CompletionCache(max_entries=4096, ttl=24 * 60 * 60)
+
+
+def get_executor():
+    """Threads that summarise chunks, shared by every report of this process."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="report-analysis")
+        return _executor
+
+
+def format_turn(msg):
+    return f"{msg['role'].capitalize()}: {msg['content']}\n"
+
+
+def chunk_texts(texts, max_tokens=CHUNK_TOKENS):
+    """Group consecutive texts into chunks of at most max_tokens (a longer text is a chunk of its own)."""
+    chunks = []
+    chunk = ""
+    for text in texts:
+        if chunk and estimate_tokens(chunk + text) > max_tokens:
+            chunks.append(chunk)
+            chunk = ""
+        chunk += text
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def summary_cache_stats():
+    return _summaries.stats()
+
+
+def summarize(complete, instructions, text):
+    """Summary of one chunk, from the cache when the same chunk was summarised before."""
+    key = hashlib.sha256((instructions + text).encode('utf-8')).hexdigest()
+    summary = _summaries.get(key)
+    if summary is None:
+        summary = complete(instructions + text)
+        # The circuit breaker's stand-in is no summary of anything
+        if summary.strip() and summary != CANNED_RESPONSE:
+            _summaries.put(key, summary)
+    return summary
+
+
+def summarize_all(complete, instructions, chunks):
+    """Summaries of all chunks in order, computed in parallel."""
+    futures = [get_executor().submit(summarize, complete, instructions, chunk) for chunk in chunks]
+    return [future.result() for future in futures]
+
+
+def analyze_conversation(conversation_history, complete, chunk_tokens=CHUNK_TOKENS):
+    """The report's analysis text for a conversation, `complete(prompt)` returning the model's text."""
+    chunks = chunk_texts([format_turn(msg) for msg in conversation_history], chunk_tokens)
+    if len(chunks) <= 1:
+        return complete(REPORT_INSTRUCTIONS + "\n\nConversation:\n" + "".join(chunks))
+
+    notes = [f"Part {n}:\n{summary.strip()}\n\n"
+             for n, summary in enumerate(summarize_all(complete, CHUNK_INSTRUCTIONS, chunks), 1)]
+    # Fold the notes in groups until they fit in one prompt
+    while estimate_tokens("".join(notes)) > chunk_tokens and len(notes) > 1:
+        groups = chunk_texts(notes, chunk_tokens)
+        if len(groups) == len(notes):
+            # Every note is a group of its own, merging them pairwise is the only way to shrink
+            groups = ["".join(notes[n:n + 2]) for n in range(0, len(notes), 2)]
+        notes = [f"Part {n}:\n{summary.strip()}\n\n"
+                 for n, summary in enumerate(summarize_all(complete, COMBINE_INSTRUCTIONS, groups), 1)]
+    return complete(REPORT_INSTRUCTIONS
+                    + "The conversation was long, so here are notes on its consecutive parts instead."
+                    + "\n\nNotes:\n" + "".join(notes))
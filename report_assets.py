@@ -0,0 +1,67 @@
+"""Pre-rendered static images for the PDF report.
+
+The logo and flowchart never change between reports, so they are downsampled
+once to the size and DPI they are drawn at in the PDF (never upscaled beyond
+their source) and kept in memory as PNG bytes. An asset is re-rendered only when its source file changes.
+"""
+
+import io
+import os
+import threading
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+# Resolution the report images are rendered at
+ASSET_DPI = 150
+# name: (source file, width in inches, height in inches) as drawn in the PDF
+REPORT_ASSETS = {
+    'logo': ('recordMic.png', 1, 1),
+    'flowchart': ('flowchart.png', 6, 4),
+}
+
+_rendered = {}  # name -> (mtime, png bytes)
+_lock = threading.Lock()
+
+
+def render_asset(path, width, height, dpi=ASSET_DPI):
+    """Downsample an image file to width x height inches at dpi and return PNG bytes.
+
+    A source smaller than that keeps its own pixels, the PDF scales it up for free.
+    """
+    from PIL import Image as PILImage
+
+    with PILImage.open(path) as img:
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        size = (min(img.width, round(width * dpi)), min(img.height, round(height * dpi)))
+        if size != img.size:
+            img = img.resize(size, PILImage.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', optimize=True, dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
+def asset_bytes(name):
+    """Return the pre-rendered PNG bytes for an asset, re-rendering if the source changed."""
+    filename, width, height = REPORT_ASSETS[name]
+    path = os.path.join(ASSET_DIR, filename)
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _rendered.get(name)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, render_asset(path, width, height))
+            _rendered[name] = cached
+    return cached[1]
+
+
+def asset_image(name):
+    """Return a ReportLab Image flowable for an asset at its report size."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image
+
+    _, width, height = REPORT_ASSETS[name]
+    return Image(io.BytesIO(asset_bytes(name)), width=width * inch, height=height * inch)
+
+
+def preload_assets():
+    """Render every report asset up front so the first report does not pay for it."""
+    for name in REPORT_ASSETS:
+        asset_bytes(name)
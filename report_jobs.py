@@ -0,0 +1,100 @@
+"""Background job queue for report generation.
+
+Reports are built on a bounded pool of worker threads so the Streamlit script
+never blocks on the analysis call, the chart render or the PDF build. Finished
+PDFs are kept for download until they expire, and submitting the same
+session's conversation snapshot again returns the job that already exists for it.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def snapshot_key(conversation_history):
+    """Hash a conversation snapshot so duplicate submissions can be detected."""
+    raw = json.dumps(conversation_history, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ReportJob:
+    """State of one report: its stage, and the PDF once it is built."""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.stage = None
+        self.pdf_data = None
+        self.pdf_filename = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+
+class ReportJobQueue:
+    """Runs report builds on a bounded worker pool and keeps results for `ttl` seconds."""
+
+    def __init__(self, build_report, max_workers=2, ttl=15 * 60):
+        self.build_report = build_report
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self.jobs = {}
+        self.jobs_by_key = {}
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        for job in list(self.jobs.values()):
+            if job.finished is not None and now - job.finished > self.ttl:
+                del self.jobs[job.id]
+                if self.jobs_by_key.get(job.key) is job:
+                    del self.jobs_by_key[job.key]
+
+    def _run(self, job, conversation_history, build_args):
+        job.status = RUNNING
+        try:
+            job.pdf_data, job.pdf_filename = self.build_report(
+                conversation_history, progress=job.set_stage, **build_args)
+            job.status = DONE
+        except Exception as e:
+            print(f"Report job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        job.finished = time.time()
+
+    def submit(self, conversation_history, session_id=None, **build_args):
+        """Queue a report for a session's conversation snapshot and return its job id."""
+        snapshot = [dict(msg) for msg in conversation_history]
+        # A report scoring the session's recordings depends on more than the snapshot, it is never shared
+        key = None
+        if build_args.get('score_pronunciation') is None:
+            key = snapshot_key([session_id, build_args.get('header_text'), snapshot, build_args.get('weekly_progress')])
+        with self.lock:
+            self._expire()
+            job = self.jobs_by_key.get(key) if key is not None else None
+            if job is not None and job.status != FAILED:
+                return job.id
+            job = ReportJob(key)
+            self.jobs[job.id] = job
+            if key is not None:
+                self.jobs_by_key[key] = job
+        self.executor.submit(self._run, job, snapshot, build_args)
+        return job.id
+
+    def get(self, job_id):
+        """Return the job for an id, or None if it is unknown or has expired."""
+        with self.lock:
+            self._expire()
+            return self.jobs.get(job_id)
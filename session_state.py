@@ -0,0 +1,425 @@
+"""Session state that outlives the worker a browser is connected to.
+
+Streamlit keeps st.session_state in the memory of one worker process, so a
+restart loses it and a session cannot move to another worker behind a load
+balancer. The keys that matter beyond one script run (which page of the
+transcript is open, the pending report, which recordings to score for it) are
+kept in a session-state backend under the session id instead: loaded when the
+session starts on any worker, and written back at the end of every run that
+changed them. The conversation itself is in the conversation store, or in the
+chat service.
+
+Large values such as recordings are not part of the state: each is written
+once as a blob of the session (put_blob) and the state only names it, so a
+save never rewrites audio.
+
+Backends, chosen with SESSION_STATE_URL:
+
+- MemorySessionState (the default) keeps states in this process; a restart
+  still loses them.
+- RedisSessionState (redis://[:password@]host:port/db) keeps them in Redis, or
+  anything speaking its protocol such as the local stand-in mock_kv.py, shared
+  by every worker.
+
+States are serialised compactly: their JSON is zlib-compressed and bytes
+values are appended raw instead of being base64-encoded. Every
+save names the version it was based on and fails with StaleSessionState when
+another worker saved the session in between; SessionSync then reloads the
+session and re-applies only the keys its run changed. States expire `ttl`
+seconds (SESSION_STATE_TTL, a day by default) after their last save, blobs
+`ttl` seconds after they were written.
+"""
+
+import abc
+import contextlib
+import copy
+import json
+import os
+import queue
+import random
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+
+DEFAULT_TTL = 24 * 60 * 60
+
+# A bytes value in the JSON document refers to a blob appended after it
+BLOB = "__bytes__"
+# Format, document length and blob count, then each blob's length
+HEADER = struct.Struct('>BII')
+BLOB_LENGTH = struct.Struct('>I')
+FORMAT = 1
+
+
+class StaleSessionState(Exception):
+    """The session was saved by someone else since the version a save was based on."""
+
+
+def encode(state):
+    """Compact bytes of a state made of JSON values and bytes."""
+    blobs = []
+
+    def pack(value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            blobs.append(bytes(value))
+            return {BLOB: len(blobs) - 1}
+        if isinstance(value, dict):
+            return {key: pack(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [pack(item) for item in value]
+        return value
+
+    document = zlib.compress(json.dumps(pack(state), separators=(',', ':')).encode('utf-8'))
+    return b"".join([HEADER.pack(FORMAT, len(document), len(blobs)), document]
+                    + [BLOB_LENGTH.pack(len(blob)) for blob in blobs] + blobs)
+
+
+def decode(data):
+    """The state encoded in `data`; tuples come back as lists.
+
+    Raises ValueError if `data` is not a state encoded by encode().
+    """
+    data = memoryview(data)
+    try:
+        version, document_length, blob_count = HEADER.unpack_from(data)
+        if version != FORMAT:
+            raise ValueError(f"Unknown session state format {version}")
+        offset = HEADER.size
+        document = json.loads(zlib.decompress(data[offset:offset + document_length]))
+        offset += document_length
+        lengths = [BLOB_LENGTH.unpack_from(data, offset + n * BLOB_LENGTH.size)[0] for n in range(blob_count)]
+    except (struct.error, zlib.error) as e:
+        raise ValueError(f"Corrupt session state: {e}") from e
+    offset += blob_count * BLOB_LENGTH.size
+    blobs = []
+    for length in lengths:
+        blobs.append(bytes(data[offset:offset + length]))
+        offset += length
+
+    def unpack(value):
+        if isinstance(value, dict):
+            if len(value) == 1 and BLOB in value:
+                return blobs[value[BLOB]]
+            return {key: unpack(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [unpack(item) for item in value]
+        return value
+
+    return unpack(document)
+
+
+class SessionStateBackend(abc.ABC):
+    """Where session states are kept: load, compare-and-set save and delete by session id.
+
+    A session that was never saved (or has expired) loads as ({}, 0).
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def load(self, session_id):
+        """Return (state, version) of a session."""
+
+    @abc.abstractmethod
+    def save(self, session_id, state, version):
+        """Store a state based on `version` and return its new version.
+
+        Raises StaleSessionState if the stored version is no longer `version`.
+        """
+
+    @abc.abstractmethod
+    def delete(self, session_id):
+        """Remove a session's state."""
+
+    @abc.abstractmethod
+    def put_blob(self, session_id, name, data):
+        """Store bytes under a name of the session."""
+
+    @abc.abstractmethod
+    def get_blob(self, session_id, name):
+        """The bytes stored under a name of the session, or None if there are none (or they expired)."""
+
+
+class MemorySessionState(SessionStateBackend):
+    """Session states in this process, encoded so that every load is a copy."""
+
+    def __init__(self, ttl=DEFAULT_TTL, sweep_interval=60.0):
+        super().__init__(ttl)
+        self.states = {}
+        self.blobs = {}
+        self.lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self.last_sweep = time.monotonic()
+
+    def _current(self, session_id, now):
+        entry = self.states.get(session_id)
+        if entry is not None and entry[1] <= now:
+            del self.states[session_id]
+            return None
+        return entry
+
+    def _sweep(self, now):
+        if now - self.last_sweep < self.sweep_interval:
+            return
+        self.last_sweep = now
+        for session_id in [session_id for session_id, entry in self.states.items() if entry[1] <= now]:
+            del self.states[session_id]
+        for key in [key for key, (expires, _) in self.blobs.items() if expires <= now]:
+            del self.blobs[key]
+
+    def load(self, session_id):
+        with self.lock:
+            entry = self._current(session_id, time.monotonic())
+        if entry is None:
+            return {}, 0
+        return decode(entry[2]), entry[0]
+
+    def save(self, session_id, state, version):
+        data = encode(state)
+        with self.lock:
+            now = time.monotonic()
+            entry = self._current(session_id, now)
+            if (entry[0] if entry is not None else 0) != version:
+                raise StaleSessionState(session_id)
+            self.states[session_id] = (version + 1, now + self.ttl, data)
+            self._sweep(now)
+        return version + 1
+
+    def delete(self, session_id):
+        with self.lock:
+            self.states.pop(session_id, None)
+
+    def put_blob(self, session_id, name, data):
+        with self.lock:
+            now = time.monotonic()
+            self.blobs[session_id, name] = (now + self.ttl, bytes(data))
+            self._sweep(now)
+
+    def get_blob(self, session_id, name):
+        with self.lock:
+            expires, data = self.blobs.get((session_id, name), (0, None))
+        return data if expires > time.monotonic() else None
+
+
+class RedisError(Exception):
+    """An error reply from the key-value server."""
+
+
+class RespConnection:
+    """One connection speaking the Redis protocol (RESP2)."""
+
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile('rb')
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts += [b"$%d\r\n" % len(arg), arg, b"\r\n"]
+        self.sock.sendall(b"".join(parts))
+        return self.read()
+
+    def read(self):
+        line = self.file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("The key-value server closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode('utf-8')
+        if kind == b"-":
+            raise RedisError(rest.decode('utf-8'))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else self.file.read(length + 2)[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self.read() for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply from the key-value server: {line!r}")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+class RedisSessionState(SessionStateBackend):
+    """Session states in Redis, shared by every worker.
+
+    A state is stored under prefix + session id as its version followed by the
+    encoded state, with a TTL. Saves are compare-and-set with WATCH/MULTI/EXEC.
+    """
+
+    VERSION = struct.Struct('>Q')
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", ttl=DEFAULT_TTL, prefix="chatbot:session:", timeout=5.0,
+                 max_idle=8):
+        super().__init__(ttl)
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=max_idle)
+
+    def _connect(self):
+        connection = RespConnection(self.host, self.port, self.timeout)
+        if self.password:
+            connection.command("AUTH", self.password)
+        if self.db:
+            connection.command("SELECT", self.db)
+        return connection
+
+    @contextlib.contextmanager
+    def _connection(self):
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        try:
+            yield connection
+        except StaleSessionState:
+            # Raised between commands, nothing is left watched or queued
+            self._release(connection)
+            raise
+        except BaseException:
+            # The connection may be mid-reply or mid-transaction, do not reuse it
+            connection.close()
+            raise
+        self._release(connection)
+
+    def _release(self, connection):
+        try:
+            self.idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _split(self, data):
+        if data is None:
+            return {}, 0
+        return decode(data[self.VERSION.size:]), self.VERSION.unpack_from(data)[0]
+
+    def load(self, session_id):
+        with self._connection() as connection:
+            return self._split(connection.command("GET", self.prefix + session_id))
+
+    def save(self, session_id, state, version):
+        key = self.prefix + session_id
+        data = self.VERSION.pack(version + 1) + encode(state)
+        with self._connection() as connection:
+            # EXEC does nothing if the key changes after WATCH
+            connection.command("WATCH", key)
+            current = connection.command("GET", key)
+            if (self.VERSION.unpack_from(current)[0] if current is not None else 0) != version:
+                connection.command("UNWATCH")
+                raise StaleSessionState(session_id)
+            connection.command("MULTI")
+            connection.command("SET", key, data, "PX", int(self.ttl * 1000))
+            if connection.command("EXEC") is None:
+                raise StaleSessionState(session_id)
+        return version + 1
+
+    def delete(self, session_id):
+        with self._connection() as connection:
+            connection.command("DEL", self.prefix + session_id)
+
+    def put_blob(self, session_id, name, data):
+        with self._connection() as connection:
+            connection.command("SET", f"{self.prefix}{session_id}:blob:{name}", data, "PX", int(self.ttl * 1000))
+
+    def get_blob(self, session_id, name):
+        with self._connection() as connection:
+            return connection.command("GET", f"{self.prefix}{session_id}:blob:{name}")
+
+
+def open_session_state(url=None, ttl=None):
+    """The backend for SESSION_STATE_URL (or `url`): Redis for redis:// URLs, this process otherwise."""
+    url = url or os.getenv('SESSION_STATE_URL')
+    ttl = ttl or float(os.getenv('SESSION_STATE_TTL', DEFAULT_TTL))
+    if url and url.startswith("redis://"):
+        return RedisSessionState(url, ttl=ttl)
+    if url:
+        raise ValueError(f"Unsupported SESSION_STATE_URL: {url}")
+    return MemorySessionState(ttl=ttl)
+
+
+class SessionSync:
+    """Keeps some keys of one session's state in a backend.
+
+    load() returns the stored values; save(values) writes back the keys that
+    changed since, merging them into whatever another worker saved meanwhile.
+    The backend being unreachable never breaks the session, it just is not
+    persisted for that run (and a blob that could not be stored reads as None).
+    """
+
+    def __init__(self, backend, session_id, keys, max_attempts=5):
+        self.backend = backend
+        self.session_id = session_id
+        self.keys = keys
+        self.max_attempts = max_attempts
+        self.saved = {}
+        self.version = 0
+
+    def load(self):
+        try:
+            state, self.version = self.backend.load(self.session_id)
+        except (OSError, ConnectionError, RedisError, ValueError) as e:
+            print(f"Could not load the state of session {self.session_id}: {e}")
+            state = {}
+        self.saved = {key: state[key] for key in self.keys if key in state}
+        return dict(self.saved)
+
+    def save(self, values):
+        """Store the keys of `values` that changed and return the keys another worker changed meanwhile."""
+        changed = {key: values[key] for key in self.keys
+                   if key in values and (key not in self.saved or values[key] != self.saved[key])}
+        if not changed:
+            return {}
+        # A snapshot, the caller may keep mutating the values (e.g. appending to a list)
+        changed = copy.deepcopy(changed)
+        state = dict(self.saved, **changed)
+        version = self.version
+        try:
+            for attempt in range(self.max_attempts):
+                try:
+                    self.version = self.backend.save(self.session_id, state, version)
+                    break
+                except StaleSessionState:
+                    # Someone else saved the session, keep their keys and ours on top
+                    time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+                    stored, version = self.backend.load(self.session_id)
+                    state = dict({key: stored[key] for key in self.keys if key in stored}, **changed)
+            else:
+                print(f"Gave up saving the state of session {self.session_id} after {self.max_attempts} conflicts")
+                return {}
+        except (OSError, ConnectionError, RedisError, ValueError) as e:
+            print(f"Could not save the state of session {self.session_id}: {e}")
+            return {}
+        others = {key: value for key, value in state.items()
+                  if key not in changed and (key not in self.saved or self.saved[key] != value)}
+        self.saved = state
+        return others
+
+    def put_blob(self, name, data):
+        """Store bytes under a name of this session; False if the backend could not be reached."""
+        try:
+            self.backend.put_blob(self.session_id, name, data)
+            return True
+        except (OSError, ConnectionError, RedisError) as e:
+            print(f"Could not store {name} of session {self.session_id}: {e}")
+            return False
+
+    def get_blob(self, name):
+        """The bytes stored under a name of this session, or None."""
+        try:
+            return self.backend.get_blob(self.session_id, name)
+        except (OSError, ConnectionError, RedisError) as e:
+            print(f"Could not load {name} of session {self.session_id}: {e}")
+            return None
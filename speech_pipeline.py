@@ -0,0 +1,157 @@
+"""Sentence-pipelined text-to-speech for streamed replies.
+
+Streamed LLM output is cut into sentences as the tokens arrive. Every finished
+sentence is synthesised on a background thread while later sentences are still
+being generated, and the audio segments come back in sentence order.
+"""
+
+import collections
+import queue
+import re
+import threading
+from concurrent.futures import Future
+
+# End of a sentence: terminal punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+class SentenceSplitter:
+    """Accumulates text chunks and returns sentences as soon as they are complete.
+
+    Very short sentences ("Great!") are merged with the next one so TTS is not
+    started for every fragment.
+    """
+
+    def __init__(self, min_chars=20):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def push(self, chunk):
+        self.buffer += chunk
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self.buffer[start:match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        remainder, self.buffer = self.buffer.strip(), ""
+        return [remainder] if remainder else []
+
+
+def split_sentences(chunks, min_chars=20):
+    """Yield complete sentences from an iterable of text chunks as soon as they end."""
+    splitter = SentenceSplitter(min_chars)
+    for chunk in chunks:
+        yield from splitter.push(chunk)
+    yield from splitter.flush()
+
+
+class SpeechPipeline:
+    """Synthesises sentences off the script thread and hands back audio in order.
+
+    `synthesize(index, sentence)` returns the audio bytes for one sentence, or a
+    Future for them when synthesis runs on a worker pool. Futures let several
+    sentences synthesise concurrently while playback order is kept.
+    """
+
+    _DONE = object()
+
+    def __init__(self, synthesize, min_chars=20):
+        self.synthesize = synthesize
+        self.min_chars = min_chars
+        self.sentences = queue.Queue()
+        self.segments = collections.deque()
+        self.segments_changed = threading.Condition()
+        self.finished = False
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def _add_segment(self, segment):
+        with self.segments_changed:
+            self.segments.append(segment)
+            self.segments_changed.notify_all()
+
+    def _run(self):
+        index = 0
+        while True:
+            sentence = self.sentences.get()
+            if sentence is self._DONE:
+                break
+            try:
+                segment = self.synthesize(index, sentence)
+                if isinstance(segment, Future):
+                    segment.add_done_callback(lambda _: self._notify())
+                self._add_segment(segment)
+            except Exception as e:
+                print(f"Error synthesising sentence {index}: {e}")
+            index += 1
+        self._add_segment(self._DONE)
+
+    def _notify(self):
+        with self.segments_changed:
+            self.segments_changed.notify_all()
+
+    def feed(self, chunks):
+        """Pass text chunks through unchanged, queueing each finished sentence for TTS."""
+        splitter = SentenceSplitter(self.min_chars)
+        try:
+            for chunk in chunks:
+                for sentence in splitter.push(chunk):
+                    self.sentences.put(sentence)
+                yield chunk
+            for sentence in splitter.flush():
+                self.sentences.put(sentence)
+        finally:
+            self.close()
+
+    def close(self):
+        """Signal that no more sentences will be submitted."""
+        if not self.finished:
+            self.finished = True
+            self.sentences.put(self._DONE)
+
+    def _head_ready(self):
+        head = self.segments[0] if self.segments else None
+        return head is not None and not (isinstance(head, Future) and not head.done())
+
+    def _pop_ready(self):
+        """Pop the next segment in order if it is ready; returns (segment, done)."""
+        while self._head_ready():
+            segment = self.segments[0]
+            if segment is self._DONE:
+                return None, True
+            self.segments.popleft()
+            if isinstance(segment, Future):
+                try:
+                    segment = segment.result()
+                except Exception as e:
+                    print(f"Error synthesising sentence: {e}")
+                    continue
+            return segment, False
+        return None, False
+
+    def ready_segments(self):
+        """Return the audio segments that are already synthesised, without waiting."""
+        ready = []
+        with self.segments_changed:
+            while True:
+                segment, done = self._pop_ready()
+                if segment is None:
+                    return ready
+                ready.append(segment)
+
+    def remaining_segments(self):
+        """Yield the rest of the audio segments in order, waiting for each one."""
+        while True:
+            with self.segments_changed:
+                segment, done = self._pop_ready()
+                while segment is None and not done:
+                    self.segments_changed.wait()
+                    segment, done = self._pop_ready()
+            if done:
+                return
+            yield segment
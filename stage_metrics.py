@@ -0,0 +1,202 @@
+"""Per-stage latency histograms for the voice and report pipelines.
+
+Each stage of a turn (speech capture, preprocessing of uploaded recordings,
+recognition, pronunciation scoring, LLM time-to-first-token and total, TTS
+synthesis, audio rendering) and of a report (analysis, pronunciation scoring,
+chart render, PDF build) is timed with a span and recorded in an in-process
+histogram with fixed buckets. Recording is
+a clock read, a bisect and a counter increment under a lock, cheap enough to
+leave on in production.
+
+The histograms can be scraped in Prometheus text format or as JSON from a small
+HTTP endpoint, and every observation can also be appended to a JSON-lines file:
+
+    METRICS_PORT=9464 METRICS_JSONL=stages.jsonl streamlit run app.py
+    curl http://127.0.0.1:9464/metrics
+"""
+
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STT_CAPTURE = "stt_capture"
+STT_PREPROCESS = "stt_preprocess"
+STT_RECOGNITION = "stt_recognition"
+PRONUNCIATION_SCORING = "pronunciation_scoring"
+LLM_TTFT = "llm_ttft"
+LLM_TOTAL = "llm_total"
+TTS_SYNTHESIS = "tts_synthesis"
+AUDIO_RENDER = "audio_render"
+REPORT_ANALYSIS = "report_analysis"
+REPORT_PRONUNCIATION = "report_pronunciation"
+REPORT_CHART_RENDER = "report_chart_render"
+REPORT_PDF_BUILD = "report_pdf_build"
+
+# Upper bounds in seconds, from fast cache hits up to slow report builds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_NAME = "chatbot_stage_seconds"
+
+
+class Histogram:
+    """Bucketed latency distribution with a running count, sum, range and error count."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.errors = 0
+
+    def observe(self, seconds, ok=True):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        if not ok:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket that holds it.
+
+        The estimate is clamped to the observed range, so small samples do not
+        report values that were never seen.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = max(self.buckets[index - 1] if index else 0.0, self.min)
+                upper = min(self.buckets[index] if index < len(self.buckets) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+
+class StageMetrics:
+    """Histograms keyed by stage name, plus an optional JSON-lines log of observations."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, jsonl_path=None):
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.jsonl_file = open(jsonl_path, 'a', buffering=1) if jsonl_path else None
+
+    def observe(self, stage, seconds, ok=True):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds, ok)
+            if self.jsonl_file is not None:
+                self.jsonl_file.write(json.dumps(
+                    {"ts": time.time(), "stage": stage, "seconds": round(seconds, 6), "ok": ok}) + "\n")
+
+    @contextmanager
+    def span(self, stage):
+        """Time the body of a with-block as one observation of a stage."""
+        start_time = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(stage, time.perf_counter() - start_time, ok)
+
+    def snapshot(self):
+        """Count, error count, mean and estimated p50/p95/p99 (seconds) per stage."""
+        with self.lock:
+            stages = {}
+            for stage, histogram in sorted(self.histograms.items()):
+                stages[stage] = {
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "p50": histogram.quantile(0.50),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                }
+            return stages
+
+    def prometheus_text(self):
+        """All histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_NAME} Latency of chatbot pipeline stages.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        errors = [
+            "# HELP chatbot_stage_errors_total Stage spans that ended with an exception.",
+            "# TYPE chatbot_stage_errors_total counter",
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {histogram.count}')
+                errors.append(f'chatbot_stage_errors_total{{stage="{stage}"}} {histogram.errors}')
+        return "\n".join(lines + errors) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    metrics = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == "/metrics":
+            body, content_type = self.metrics.prometheus_text(), "text/plain; version=0.0.4"
+        elif path == "/metrics.json":
+            body, content_type = json.dumps(self.metrics.snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host="127.0.0.1", metrics=None):
+    """Serve /metrics (Prometheus) and /metrics.json on a background thread."""
+    handler = type("ConfiguredMetricsHandler", (MetricsHandler,), {"metrics": metrics or get_metrics()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+    return server
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics(**kwargs):
+    """Return the stage metrics of this process, building them on first use."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = StageMetrics(**kwargs)
+        return _metrics
+
+
+def span(stage):
+    """Time a with-block as one observation of a stage in this process's metrics."""
+    return get_metrics().span(stage)
+
+
+def observe(stage, seconds, ok=True):
+    get_metrics().observe(stage, seconds, ok)
@@ -0,0 +1,202 @@
+"""Speech-to-text backends, chosen per deployment with STT_BACKEND.
+
+- "google" (default) sends the finished utterance to Google's free web API, as
+  the app always did. It needs the network and is rate limited.
+- "vosk" recognises on the local CPU with a Vosk model loaded once per process.
+  It streams, so partial transcripts are available while the user is still
+  speaking and only the last words are left to decode when they stop. Set
+  VOSK_MODEL_PATH to an unpacked model, otherwise the small English model is
+  downloaded on first use. Needs `pip install vosk`.
+
+LiveTranscription recognises an utterance while it is still being captured:
+streaming backends get every frame, the others get each pause-delimited
+segment on a worker thread as soon as it ends.
+
+Backends return the transcript with the recogniser's confidence in it (0-1)
+and raise speech_recognition's UnknownValueError and RequestError, so callers
+handle every backend the same way. speech_recognition is only imported
+when a backend is used.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BACKEND = "google"
+
+
+class GoogleBackend:
+    """Recognition of a finished utterance through Google's web speech API."""
+
+    name = "google"
+    streaming = False
+
+    def __init__(self, language="en-US"):
+        import speech_recognition as sr
+        self.language = language
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audio):
+        """Transcribe speech_recognition AudioData; returns (text, confidence)."""
+        return self.recognizer.recognize_google(audio, language=self.language, with_confidence=True)
+
+    def recognize(self, audio):
+        return self.transcribe(audio)[0]
+
+
+class VoskStream:
+    """One utterance being recognised incrementally by Vosk."""
+
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments = []
+        self.word_confidences = []
+
+    def accept(self, pcm):
+        """Feed 16-bit mono PCM; return (transcript so far, whether Vosk saw an endpoint)."""
+        ended = self.recognizer.AcceptWaveform(pcm)
+        if ended:
+            self._add_result(self.recognizer.Result())
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(self.segments + ([partial] if partial else [])), ended
+
+    def _add_result(self, raw):
+        result = json.loads(raw)
+        if result.get("text"):
+            self.segments.append(result["text"])
+        self.word_confidences.extend(word["conf"] for word in result.get("result", ()))
+
+    def finish(self):
+        """Decode whatever audio is left and return the full transcript."""
+        self._add_result(self.recognizer.FinalResult())
+        return " ".join(self.segments)
+
+    @property
+    def confidence(self):
+        """Mean confidence of the recognised words, None before any were recognised."""
+        if not self.word_confidences:
+            return None
+        return sum(self.word_confidences) / len(self.word_confidences)
+
+
+class VoskBackend:
+    """Offline, streaming recognition on the local CPU."""
+
+    name = "vosk"
+    streaming = True
+    sample_rate = 16000
+
+    def __init__(self, model_path=None, lang="en-us"):
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        # Loading the model is the expensive part, keep one backend per process
+        self.model = Model(model_path) if model_path else Model(lang=lang)
+
+    def stream(self, sample_rate):
+        from vosk import KaldiRecognizer
+        recognizer = KaldiRecognizer(self.model, sample_rate)
+        # Word-level results carry the confidence of every word
+        recognizer.SetWords(True)
+        return VoskStream(recognizer)
+
+    def transcribe(self, audio):
+        """Transcribe speech_recognition AudioData; returns (text, confidence)."""
+        import speech_recognition as sr
+        stream = self.stream(self.sample_rate)
+        stream.accept(audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2))
+        text = stream.finish()
+        if not text:
+            raise sr.UnknownValueError()
+        return text, stream.confidence
+
+    def recognize(self, audio):
+        return self.transcribe(audio)[0]
+
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "vosk": lambda: VoskBackend(model_path=os.getenv('VOSK_MODEL_PATH')),
+}
+
+
+def make_backend(name=None):
+    """Build the backend named by `name`, or by STT_BACKEND when it is not given."""
+    name = (name or os.getenv('STT_BACKEND') or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend {name!r}, choose one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Threads that recognise finished segments while capture goes on."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stt")
+        return _executor
+
+
+class LiveTranscription:
+    """Recognition of one utterance that runs alongside its capture.
+
+    Pass feed_frame and feed_segment as the capture callbacks, then call
+    finish() once capture has ended; `confidence` is set by then.
+    """
+
+    def __init__(self, backend, sample_rate, sample_width=2, on_partial=None):
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.on_partial = on_partial
+        self.stream = backend.stream(sample_rate) if backend.streaming else None
+        self.futures = []
+        self.last_partial = ""
+        self.confidence = None
+
+    def feed_frame(self, frame):
+        if self.stream is None:
+            return
+        partial, _ = self.stream.accept(frame)
+        if partial != self.last_partial:
+            self.last_partial = partial
+            if self.on_partial is not None:
+                self.on_partial(partial)
+
+    def feed_segment(self, pcm):
+        if self.stream is not None:
+            return
+        import speech_recognition as sr
+        audio = sr.AudioData(pcm, self.sample_rate, self.sample_width)
+        self.futures.append(get_executor().submit(self.backend.transcribe, audio))
+
+    def finish(self):
+        """Wait for the remaining recognition and return the whole transcript."""
+        import speech_recognition as sr
+        if self.stream is not None:
+            text = self.stream.finish()
+            self.confidence = self.stream.confidence
+        else:
+            texts = []
+            confidences = []
+            for future in self.futures:
+                try:
+                    segment_text, confidence = future.result()
+                except sr.UnknownValueError:
+                    # A segment with no recognisable words, e.g. a cough between phrases
+                    continue
+                texts.append(segment_text)
+                if confidence is not None:
+                    confidences.append(confidence)
+            text = " ".join(texts)
+            if confidences:
+                self.confidence = sum(confidences) / len(confidences)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
@@ -0,0 +1,33 @@
+"""Fixtures shared by the tests: the local stand-ins for the Groq API and for Redis."""
+
+import os
+import sys
+import threading
+
+import pytest
+
+# The modules live at the top of the repository, next to the entry scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_groq  # noqa: E402
+import mock_kv  # noqa: E402
+
+
+@pytest.fixture
+def groq():
+    """A Groq stand-in on a free port, as (config, base_url); change the config to inject faults."""
+    config = mock_groq.MockConfig(ttft=0.01, tokens_per_second=5000.0, seed=0)
+    server, base_url = mock_groq.start_in_thread(config)
+    yield config, base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def kv_url():
+    """A Redis stand-in on a free port, as a redis:// URL."""
+    server = mock_kv.make_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
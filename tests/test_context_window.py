@@ -0,0 +1,99 @@
+import threading
+
+from chatbot.core import ChatCore
+from context_window import ContextWindow, count_message_tokens
+from conversation_store import ConversationStore
+
+
+def conversation(turns):
+    history = [{"role": "assistant", "content": "Hello! I'm here to help you practise."}]
+    for n in range(turns):
+        history.append({"role": "user", "content": f"This is my answer number {n}. " + "word " * (n % 7 * 10)})
+        history.append({"role": "assistant", "content": f"Well done on answer {n}! Now try the next one."})
+    return history
+
+
+def test_resumed_builds_match_full_builds():
+    history = conversation(100)
+    full = ContextWindow(max_tokens=400, keep_recent=6)
+    resumed = ContextWindow(max_tokens=400, keep_recent=6)
+    for end in range(1, len(history) + 1):
+        start = resumed.resume_from()
+        assert resumed.build(history[start:end], start) == full.build(history[:end])
+        assert resumed.folded == full.folded
+
+
+def test_resume_skips_the_pinned_and_folded_turns():
+    window = ContextWindow(max_tokens=100000, keep_recent=4)
+    assert window.resume_from() == 0
+    window.build(conversation(10))
+    # 21 turns: the pinned intro, 16 folded and the 4 recent ones
+    assert window.folded == 16
+    assert window.resume_from() == 17
+
+
+def test_prompt_stays_within_budget_and_keeps_the_latest_turn():
+    history = conversation(60)
+    window = ContextWindow(max_tokens=300, keep_recent=8)
+    messages = window.build(history)
+    assert count_message_tokens(messages) <= 300
+    assert messages[0] == history[0]
+    assert messages[-1] == history[-1]
+
+
+def test_replaced_history_starts_over():
+    window = ContextWindow(max_tokens=100000, keep_recent=2)
+    window.build(conversation(20))
+    messages = window.build(conversation(1))
+    assert window.folded == 0
+    assert messages == conversation(1)
+
+
+def make_core(tmp_path, **kwargs):
+    store = ConversationStore(str(tmp_path / "conversations.db"), flush_interval=0.01)
+    return ChatCore(store, gateway=None, **kwargs)
+
+
+def test_core_evicts_the_least_recently_used_windows(tmp_path):
+    core = make_core(tmp_path, max_sessions=2)
+    a = core.context_window("a")
+    core.context_window("b")
+    assert core.context_window("a") is a
+    core.context_window("c")
+    assert list(core.contexts) == ["a", "c"]
+    core.store.close()
+
+
+def test_evicted_window_is_rebuilt_from_the_stored_history(tmp_path):
+    core = make_core(tmp_path, max_sessions=1, max_tokens=300, keep_recent=4)
+    for message in conversation(30):
+        core.add_turn("s", message["role"], message["content"])
+    core._begin_reply("s", "First question", None)
+    core.context_window("other")
+    messages, _ = core._begin_reply("s", "Second question", None)
+    expected = ContextWindow(max_tokens=300, keep_recent=4).build(core.history("s"))
+    assert messages == expected
+    core.store.close()
+
+
+def test_concurrent_turns_of_one_session_fold_each_turn_once(tmp_path):
+    core = make_core(tmp_path, keep_recent=4)
+    core.add_turn("s", "assistant", "Hello!")
+
+    def turns(n):
+        for i in range(30):
+            core._begin_reply("s", f"Answer {n}-{i}.", None)
+            core.add_turn("s", "assistant", f"Reply {n}-{i}.")
+
+    threads = [threading.Thread(target=turns, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    window, _ = core.context_window("s")
+    history = core.history("s")
+    assert window.pinned + window.folded <= len(history)
+    fresh = ContextWindow(keep_recent=4)
+    fresh.build(history[:window.pinned + window.folded + window.keep_recent])
+    assert window.summary_lines == fresh.summary_lines
+    core.store.close()
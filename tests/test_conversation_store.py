@@ -0,0 +1,120 @@
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+from conversation_store import ConversationStore
+
+# Fresh interpreters, a forked child would inherit this process's open SQLite connections and their locks
+spawn = multiprocessing.get_context("spawn")
+
+
+def append_turns(path, session_id, count, barrier):
+    store = ConversationStore(path, flush_interval=0.01, batch_size=16)
+    barrier.wait()
+    for n in range(count):
+        store.append(session_id, "user", f"turn {n}")
+    store.close()
+
+
+def seqs(path, session_id):
+    with sqlite3.connect(path) as connection:
+        return [row[0] for row in connection.execute(
+            "SELECT seq FROM turns WHERE session_id = ? ORDER BY seq", (session_id,))]
+
+
+def test_writer_processes_number_one_session_contiguously(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    ConversationStore(path).close()
+    barrier = spawn.Barrier(4)
+    workers = [spawn.Process(target=append_turns, args=(path, "shared", 150, barrier)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    assert seqs(path, "shared") == list(range(600))
+
+
+def test_writer_threads_number_their_own_sessions(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"), flush_interval=0.01, batch_size=8)
+
+    def append(session_id):
+        for n in range(100):
+            store.append(session_id, "user", f"{session_id} {n}")
+
+    threads = [threading.Thread(target=append, args=(f"s{n}",)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.flush()
+    for n in range(8):
+        turns = store.turns(f"s{n}")
+        assert [turn["seq"] for turn in turns] == list(range(100))
+        # Each session's turns keep the order they were appended in
+        assert [turn["content"] for turn in turns] == [f"s{n} {i}" for i in range(100)]
+    store.close()
+
+
+def test_queued_turns_are_read_back_before_they_are_stored(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"), flush_interval=0.01)
+    store.append("s", "assistant", "Hello!")
+    assert store.flush()
+    store.flush_interval = 60
+    store.append("s", "user", "Hi")
+    store.append("s", "assistant", "How are you?")
+    turns = store.turns("s")
+    assert [turn["content"] for turn in turns] == ["Hello!", "Hi", "How are you?"]
+    assert [turn["seq"] for turn in turns] == [0, None, None]
+    assert store.count("s") == 3
+    assert store.flush()
+    assert [turn["seq"] for turn in store.turns("s")] == [0, 1, 2]
+    store.close()
+
+
+def test_since_seq_and_limit_read_only_the_newest_turns(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"), flush_interval=0.01)
+    for n in range(10):
+        store.append("s", "user", f"turn {n}")
+    assert store.flush()
+    assert [msg["content"] for msg in store.history("s", since_seq=7)] == ["turn 7", "turn 8", "turn 9"]
+    assert [msg["content"] for msg in store.history("s", limit=2)] == ["turn 8", "turn 9"]
+    store.close()
+
+
+def test_batch_that_keeps_failing_is_dropped(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    store = ConversationStore(path, flush_interval=0.01, max_attempts=3)
+    with sqlite3.connect(path) as connection:
+        connection.execute("DROP TABLE turns")
+    store.append("s", "user", "lost")
+    start = time.monotonic()
+    store.close()
+    assert time.monotonic() - start < 5
+    assert store.dropped == 1
+
+
+def open_store(path, barrier):
+    barrier.wait()
+    ConversationStore(path).close()
+
+
+def test_processes_opening_an_old_database_backfill_it_once(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    with sqlite3.connect(path) as connection:
+        # The turns table as first released, with no progress aggregates yet
+        connection.execute("CREATE TABLE turns (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                           "seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL, "
+                           "latency REAL, ttft REAL, tokens INTEGER, prompt_tokens INTEGER)")
+        connection.executemany("INSERT INTO turns (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                               [(f"s{n % 4}", n // 4, "user", "hi", time.time()) for n in range(40)])
+    barrier = spawn.Barrier(4)
+    workers = [spawn.Process(target=open_store, args=(path, barrier)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT SUM(turns) FROM weekly_progress").fetchone()[0] == 40
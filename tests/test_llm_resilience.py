@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from llm_gateway import CompletionCancelled, LLMGateway
+from llm_resilience import CANNED_RESPONSE, CLOSED, HALF_OPEN, OPEN, TRIAL, CircuitBreaker, HedgePolicy, RetryPolicy
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+def trip(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def open_breaker(reset_timeout=0.2):
+    return trip(CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout))
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = open_breaker()
+    time.sleep(0.25)
+    assert breaker.allow() == TRIAL
+    assert breaker.state == HALF_OPEN
+    # Everyone else is turned away while the trial is out
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() is True
+
+
+def test_failed_trial_opens_the_breaker_again():
+    breaker = open_breaker()
+    time.sleep(0.25)
+    assert breaker.allow() == TRIAL
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+
+
+def test_released_trial_lets_the_next_request_try():
+    breaker = open_breaker()
+    time.sleep(0.25)
+    assert breaker.allow() == TRIAL
+    breaker.release_trial()
+    assert breaker.allow() == TRIAL
+
+
+def test_lost_trial_times_out():
+    breaker = open_breaker()
+    time.sleep(0.25)
+    assert breaker.allow() == TRIAL
+    assert breaker.allow() is False
+    time.sleep(0.25)
+    assert breaker.allow() == TRIAL
+
+
+def test_only_one_of_many_concurrent_requests_is_the_trial():
+    breaker = open_breaker()
+    time.sleep(0.25)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(breaker.allow())) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(TRIAL) == 1
+    assert results.count(False) == 15
+
+
+@pytest.fixture
+def gateway(groq):
+    _, base_url = groq
+    gateway = LLMGateway(api_key="mock", base_url=base_url, retry_policy=RetryPolicy(max_retries=0),
+                         hedge_policy=HedgePolicy(enabled=False),
+                         breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.5))
+    trip(gateway.breaker)
+    yield gateway
+    gateway.close()
+
+
+def complete(gateway):
+    return gateway.complete(MESSAGES, session_id="s", model="llama3-8b-8192")
+
+
+def test_open_breaker_serves_the_canned_response(gateway):
+    assert complete(gateway) == CANNED_RESPONSE
+    assert gateway.resilience_metrics()["breaker_rejections"] == 1
+
+
+def test_successful_trial_closes_the_breaker(groq, gateway):
+    time.sleep(0.55)
+    assert complete(gateway) == groq[0].reply
+    assert gateway.breaker.state == CLOSED
+
+
+def test_failed_trial_keeps_serving_the_canned_response(groq, gateway):
+    config, _ = groq
+    config.error_rate = 1.0
+    time.sleep(0.55)
+    with pytest.raises(Exception):
+        complete(gateway)
+    assert gateway.breaker.state == OPEN
+    assert complete(gateway) == CANNED_RESPONSE
+
+
+def test_cancelled_trial_is_released_and_not_stored_as_a_reply(groq, gateway):
+    config, _ = groq
+    config.ttft = 1.0
+    time.sleep(0.55)
+    outcome = []
+
+    def stream():
+        try:
+            outcome.append("".join(gateway.stream_chat(MESSAGES, session_id="s", model="llama3-8b-8192")))
+        except CompletionCancelled:
+            outcome.append("cancelled")
+
+    thread = threading.Thread(target=stream)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while gateway.in_flight_count() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with gateway.lock:
+        futures = list(gateway.session_tasks["s"])
+    for future in futures:
+        future.cancel()
+    thread.join(5)
+    # A cancelled stream is an error, not a short reply
+    assert outcome == ["cancelled"]
+
+    # The trial was given back, so the next request is the one that tests the upstream
+    config.ttft = 0.01
+    assert complete(gateway) == config.reply
+    assert gateway.breaker.state == CLOSED
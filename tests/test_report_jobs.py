@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from report_jobs import DONE, FAILED, ReportJobQueue
+
+HISTORY = [
+    {"role": "assistant", "content": "Hello! How are you today?"},
+    {"role": "user", "content": "Good, I want to practise p and b."},
+]
+PROGRESS = [{"week": "2026-10-12", "turns": 2}]
+
+
+@pytest.fixture
+def jobs():
+    built = []
+
+    def build_report(conversation_history, progress=None, **build_args):
+        built.append(build_args)
+        if build_args.get("header_text") == "broken":
+            raise RuntimeError("chart failed")
+        return b"%PDF", "report.pdf"
+
+    queue = ReportJobQueue(build_report, max_workers=2, ttl=60)
+    queue.built = built
+    return queue
+
+
+def wait_for(jobs, job_id):
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id).status not in (DONE, FAILED) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return jobs.get(job_id)
+
+
+def test_same_snapshot_of_a_session_shares_its_job(jobs):
+    first = jobs.submit(HISTORY, session_id="a", header_text="Header", weekly_progress=PROGRESS)
+    assert jobs.submit(list(HISTORY), session_id="a", header_text="Header", weekly_progress=PROGRESS) == first
+    wait_for(jobs, first)
+    assert len(jobs.built) == 1
+
+
+def test_session_header_and_progress_are_part_of_the_key(jobs):
+    first = jobs.submit(HISTORY, session_id="a", header_text="Header", weekly_progress=PROGRESS)
+    others = {
+        jobs.submit(HISTORY, session_id="b", header_text="Header", weekly_progress=PROGRESS),
+        jobs.submit(HISTORY, session_id="a", header_text="Other header", weekly_progress=PROGRESS),
+        jobs.submit(HISTORY, session_id="a", header_text="Header", weekly_progress=[]),
+        jobs.submit(HISTORY + [{"role": "assistant", "content": "Great!"}], session_id="a", header_text="Header",
+                    weekly_progress=PROGRESS),
+    }
+    assert first not in others
+    assert len(others) == 4
+
+
+def test_reports_scoring_recordings_are_never_shared(jobs):
+    first = jobs.submit(HISTORY, session_id="a", header_text="Header", score_pronunciation=dict)
+    second = jobs.submit(HISTORY, session_id="a", header_text="Header", score_pronunciation=dict)
+    assert first != second
+    wait_for(jobs, first)
+    wait_for(jobs, second)
+    assert len(jobs.built) == 2
+
+
+def test_failed_job_is_built_again_on_the_next_submit(jobs):
+    first = jobs.submit(HISTORY, session_id="a", header_text="broken")
+    assert wait_for(jobs, first).status == FAILED
+    second = jobs.submit(HISTORY, session_id="a", header_text="broken")
+    assert second != first
+
+
+def test_concurrent_submits_of_one_snapshot_make_one_job(jobs):
+    job_ids = []
+    barrier = threading.Barrier(8)
+
+    def submit():
+        barrier.wait()
+        job_ids.append(jobs.submit(HISTORY, session_id="a", header_text="Header", weekly_progress=PROGRESS))
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(job_ids)) == 1
+    assert wait_for(jobs, job_ids[0]).status == DONE
+    assert len(jobs.built) == 1
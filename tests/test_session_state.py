@@ -0,0 +1,102 @@
+import socket
+import threading
+
+import pytest
+
+from session_state import MemorySessionState, RedisSessionState, SessionSync, StaleSessionState
+
+KEYS = ("visible_turns", "recording_ids", "report_job_id")
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        return MemorySessionState()
+    return RedisSessionState(request.getfixturevalue("kv_url"))
+
+
+def test_state_round_trips(backend):
+    sync = SessionSync(backend, "s", KEYS)
+    assert sync.load() == {}
+    assert sync.save({"visible_turns": 40, "recording_ids": ["r1"], "not_persisted": 1}) == {}
+    assert SessionSync(backend, "s", KEYS).load() == {"visible_turns": 40, "recording_ids": ["r1"]}
+
+
+def test_unchanged_keys_are_not_saved_again(backend):
+    sync = SessionSync(backend, "s", KEYS)
+    sync.load()
+    sync.save({"visible_turns": 20})
+    version = sync.version
+    assert sync.save({"visible_turns": 20}) == {}
+    assert sync.version == version
+
+
+def test_concurrent_saves_keep_both_workers_keys(backend):
+    first = SessionSync(backend, "s", KEYS)
+    second = SessionSync(backend, "s", KEYS)
+    first.load()
+    second.load()
+    assert first.save({"visible_turns": 40}) == {}
+    # The second worker's save is based on a stale version, it re-applies only its own key
+    assert second.save({"report_job_id": "job-1"}) == {"visible_turns": 40}
+    assert SessionSync(backend, "s", KEYS).load() == {"visible_turns": 40, "report_job_id": "job-1"}
+
+
+def test_later_save_of_the_same_key_wins(backend):
+    first = SessionSync(backend, "s", KEYS)
+    second = SessionSync(backend, "s", KEYS)
+    first.load()
+    second.load()
+    first.save({"visible_turns": 40})
+    second.save({"visible_turns": 60})
+    assert SessionSync(backend, "s", KEYS).load() == {"visible_turns": 60}
+
+
+def test_many_workers_saving_at_once_lose_no_key(backend):
+    keys = tuple(f"key{n}" for n in range(8))
+    barrier = threading.Barrier(len(keys))
+
+    def save(key):
+        sync = SessionSync(backend, "s", keys, max_attempts=50)
+        sync.load()
+        barrier.wait()
+        sync.save({key: key})
+
+    threads = [threading.Thread(target=save, args=(key,)) for key in keys]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert SessionSync(backend, "s", keys).load() == {key: key for key in keys}
+
+
+def test_blobs_are_stored_apart_from_the_state(backend):
+    sync = SessionSync(backend, "s", KEYS)
+    assert sync.put_blob("recording:r1", b"\x00\x01" * 1000)
+    assert sync.get_blob("recording:r1") == b"\x00\x01" * 1000
+    assert sync.get_blob("recording:missing") is None
+    assert sync.load() == {}
+
+
+def test_unreachable_backend_does_not_break_the_session():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    sync = SessionSync(RedisSessionState(f"redis://127.0.0.1:{port}/0", timeout=0.2), "s", KEYS)
+    assert sync.load() == {}
+    assert sync.save({"visible_turns": 40}) == {}
+    assert sync.put_blob("recording:r1", b"audio") is False
+    assert sync.get_blob("recording:r1") is None
+
+
+def test_corrupt_state_found_on_a_conflict_does_not_break_the_save():
+    class CorruptAfterConflict(MemorySessionState):
+        def save(self, session_id, state, version):
+            raise StaleSessionState(session_id)
+
+        def load(self, session_id):
+            raise ValueError("Unknown session state format 9")
+
+    sync = SessionSync(CorruptAfterConflict(), "s", KEYS)
+    assert sync.load() == {}
+    assert sync.save({"visible_turns": 40}) == {}
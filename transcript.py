@@ -0,0 +1,41 @@
+"""HTML of the chat transcript.
+
+Only a window of the most recent turns is shown, so the page sent to the
+browser stays the same size however long the session gets; earlier turns are
+loaded a page at a time on request. A stored turn never changes, so its bubble
+is built (and its text escaped) once per session and looked up by its
+sequence number after that.
+"""
+
+import html
+
+# Turns shown at first, and added by every "Load earlier messages"
+PAGE_SIZE = 20
+
+
+def bubble_html(role, content):
+    """Chat bubble of one message, its text escaped so it is shown rather than interpreted as HTML."""
+    text = html.escape(content)
+    if role == "user":
+        return f'<div class="chat-bubble user-bubble">You: {text}</div>'
+    return f'<div class="chat-bubble bot-bubble">Bot: {text}</div>'
+
+
+class TranscriptCache:
+    """Bubble HTML of one session's stored turns, keyed by sequence number."""
+
+    def __init__(self):
+        self.bubbles = {}
+
+    def bubble(self, turn):
+        if turn["seq"] is None:
+            # Not numbered until the store commits it
+            return bubble_html(turn["role"], turn["content"])
+        bubble = self.bubbles.get(turn["seq"])
+        if bubble is None:
+            bubble = self.bubbles[turn["seq"]] = bubble_html(turn["role"], turn["content"])
+        return bubble
+
+    def html(self, turns):
+        """The chat container with the bubbles of these turns."""
+        return '<div class="chat-container">' + "".join(self.bubble(turn) for turn in turns) + '</div>'
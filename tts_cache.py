@@ -0,0 +1,104 @@
+"""Content-addressed cache for synthesised speech.
+
+Audio is keyed by the normalised text and the voice settings used to speak it.
+Recently used clips stay in an in-memory LRU; everything is also written to an
+on-disk tier that is trimmed back to a size limit, oldest clips first.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different strings share an entry."""
+    return " ".join(text.split())
+
+
+def cache_key(text, voice_id, rate, volume):
+    """Hash the spoken text and the voice settings into a cache key."""
+    raw = "\x1f".join([normalize_text(text), str(voice_id), str(rate), str(volume)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """Two-tier (memory + disk) LRU cache of audio bytes with hit/miss counters."""
+
+    def __init__(self, cache_dir='.tts_cache', memory_bytes=32 * 1024 * 1024, disk_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.disk_size = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.audio')
+
+    def _remember(self, key, data):
+        if key in self.memory:
+            self.memory_size -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_bytes and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+
+    def _trim_disk(self):
+        entries = sorted((entry for entry in os.scandir(self.cache_dir) if entry.is_file()),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.disk_size <= self.disk_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.disk_size -= size
+            except OSError:
+                pass
+
+    def get(self, key):
+        """Return the cached audio for a key, or None."""
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as audio_file:
+                    data = audio_file.read()
+                os.utime(path)  # Mark as recently used for disk eviction
+            except OSError:
+                self.stats["misses"] += 1
+                return None
+
+            self.stats["disk_hits"] += 1
+            self._remember(key, data)
+            return data
+
+    def put(self, key, data):
+        """Store audio in both tiers, evicting old entries when over the limits."""
+        with self.lock:
+            self._remember(key, data)
+            path = self._path(key)
+            if os.path.exists(path):
+                return
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as audio_file:
+                audio_file.write(data)
+            os.replace(tmp_path, path)
+            self.disk_size += len(data)
+            if self.disk_size > self.disk_bytes:
+                self._trim_disk()
+
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
@@ -0,0 +1,177 @@
+"""Process pool for text-to-speech synthesis.
+
+Every worker process owns its own pyttsx3 engine, configured once with the
+voice, rate and volume, so concurrent sessions never share or reconfigure an
+engine. Audio comes back as bytes; each synthesis writes to a private temporary
+file inside the worker instead of a path shared between sessions.
+
+The "silence" driver writes silent WAV audio of realistic length without a
+speech engine, for benchmarks and headless runs where no voice is installed.
+"""
+
+import collections
+import os
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+from stage_metrics import TTS_SYNTHESIS, observe
+
+# Engine owned by the current worker process
+_engine = None
+
+
+class SilentEngine:
+    """Offline stand-in for a pyttsx3 engine that writes silent WAV files.
+
+    The audio lasts as long as the text would take to speak at the configured
+    rate (words per minute), so downstream sizes and timings stay realistic.
+    """
+
+    SAMPLE_RATE = 16000
+
+    def __init__(self):
+        self.properties = {'voice': 'silence', 'voices': [], 'rate': 200, 'volume': 1.0}
+        self.queued = []
+
+    def getProperty(self, name):
+        return self.properties[name]
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def save_to_file(self, text, filename):
+        self.queued.append((text, filename))
+
+    def runAndWait(self):
+        for text, filename in self.queued:
+            seconds = max(0.2, len(text.split()) * 60.0 / self.properties['rate'])
+            with wave.open(filename, 'wb') as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(self.SAMPLE_RATE)
+                wav_file.writeframes(bytes(2 * int(seconds * self.SAMPLE_RATE)))
+        self.queued = []
+
+
+def _init_worker(driver, voice_index, rate, volume):
+    """Create and configure this worker's engine once."""
+    global _engine
+    if driver == "silence":
+        _engine = SilentEngine()
+    else:
+        import pyttsx3
+        _engine = pyttsx3.init(driver) if driver else pyttsx3.init()
+    voices = _engine.getProperty('voices')
+    if voices:
+        _engine.setProperty('voice', voices[min(voice_index, len(voices) - 1)].id)
+    _engine.setProperty('rate', rate)
+    _engine.setProperty('volume', volume)
+
+
+def _voice_id():
+    return _engine.getProperty('voice')
+
+
+def _synthesize(text):
+    """Speak text into a private temporary file and return its bytes."""
+    fd, audio_filename = tempfile.mkstemp(suffix='.wav', prefix='tts_')
+    os.close(fd)
+    try:
+        _engine.save_to_file(text, audio_filename)
+        _engine.runAndWait()
+        with open(audio_filename, 'rb') as audio_file:
+            return audio_file.read()
+    finally:
+        os.remove(audio_filename)
+
+
+class TTSService:
+    """Bounded pool of TTS worker processes with queue-depth and latency metrics."""
+
+    def __init__(self, workers=None, max_queue=64, driver=None, voice_index=1, rate=125, volume=1.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.rate = rate
+        self.volume = volume
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(driver, voice_index, rate, volume),
+        )
+        # Submissions beyond max_queue wait here instead of piling onto the pool
+        self.max_queue = max_queue
+        self.slots = threading.BoundedSemaphore(max_queue)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.latencies = collections.deque(maxlen=1000)
+        self._voice_id = None
+
+    @property
+    def voice_id(self):
+        """The voice the workers speak with, as reported by one of them."""
+        if self._voice_id is None:
+            self._voice_id = self.executor.submit(_voice_id).result()
+        return self._voice_id
+
+    def submit(self, text, timeout=None):
+        """Queue text for synthesis and return a Future for the audio bytes."""
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError("TTS queue is full")
+        start_time = time.perf_counter()
+        with self.lock:
+            self.pending += 1
+
+        def finished(future):
+            elapsed = time.perf_counter() - start_time
+            ok = not future.cancelled() and future.exception() is None
+            with self.lock:
+                self.pending -= 1
+                if ok:
+                    self.completed += 1
+                    self.latencies.append(elapsed)
+                else:
+                    self.failed += 1
+            self.slots.release()
+            observe(TTS_SYNTHESIS, elapsed, ok)
+
+        try:
+            future = self.executor.submit(_synthesize, text)
+        except Exception:
+            with self.lock:
+                self.pending -= 1
+            self.slots.release()
+            raise
+        future.add_done_callback(finished)
+        return future
+
+    def synthesize(self, text, timeout=None):
+        """Synthesise text and wait for the audio bytes, for at most `timeout` seconds in all if given."""
+        if timeout is None:
+            return self.submit(text).result()
+        deadline = time.monotonic() + timeout
+        # Waiting for room in the queue counts against the timeout too
+        future = self.submit(text, timeout=timeout)
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+
+    def metrics(self):
+        """Queue depth and synthesis latency (seconds, queueing included)."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            metrics = {
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+        if latencies:
+            metrics["latency_p50"] = latencies[len(latencies) // 2]
+            metrics["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            metrics["latency_mean"] = sum(latencies) / len(latencies)
+        return metrics
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,131 @@
+"""Voice-activity detection and endpointing for microphone capture.
+
+Every frame read from the microphone is classified as speech or not by its
+energy against a threshold calibrated on the room's ambient noise. The
+calibration is cached per input device, so only the first capture on a device
+(or the first after the cache expires) pays the calibration time.
+
+Capture keeps a short ring buffer of frames before speech starts, so the onset
+of the first word is not clipped. It ends after a configurable stretch of
+trailing silence, after a time limit, or when nobody speaks at all. Pauses
+longer than the gaps between words split the utterance into a few segments
+that are handed on as soon as they end, so recognition can start before
+capture has finished.
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+# Calibration results per input device: device index -> (threshold, calibrated at)
+_calibrations = {}
+_calibrations_lock = threading.Lock()
+
+
+def frame_rms(frame):
+    """Root-mean-square amplitude of a frame of 16-bit mono PCM."""
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+
+
+class EnergyVAD:
+    """Frame classifier: speech when the frame energy is above the threshold.
+
+    Speech only starts after `start_frames` consecutive speech frames, so a
+    single click or bump does not open an utterance.
+    """
+
+    def __init__(self, threshold=300.0, start_frames=3):
+        self.threshold = threshold
+        self.start_frames = start_frames
+
+    def is_speech(self, frame):
+        return frame_rms(frame) > self.threshold
+
+
+def calibrate(source, duration=0.5, margin=2.5, min_threshold=150.0):
+    """Measure the ambient noise of a speech_recognition Microphone and return a threshold."""
+    frames = max(1, int(duration * source.SAMPLE_RATE / source.CHUNK))
+    noise = [frame_rms(source.stream.read(source.CHUNK)) for _ in range(frames)]
+    return max(min_threshold, float(np.percentile(noise, 90)) * margin)
+
+
+def calibrated_vad(source, max_age=10 * 60, **calibrate_args):
+    """An EnergyVAD for this microphone, calibrating only when the device has no recent result."""
+    device = getattr(source, 'device_index', None)
+    with _calibrations_lock:
+        cached = _calibrations.get(device)
+    if cached is None or time.monotonic() - cached[1] > max_age:
+        cached = (calibrate(source, **calibrate_args), time.monotonic())
+        with _calibrations_lock:
+            _calibrations[device] = cached
+    return EnergyVAD(threshold=cached[0])
+
+
+def capture_speech(source, vad, on_frame=None, on_segment=None, timeout=5.0, phrase_time_limit=15.0,
+                   trailing_silence=0.6, segment_pause=0.5, max_segments=3, pre_roll=0.3):
+    """Capture one utterance from a speech_recognition Microphone and return its PCM bytes.
+
+    Returns b"" when no speech started within `timeout` seconds. Once speech
+    has started, capture ends after `trailing_silence` seconds of silence or
+    `phrase_time_limit` seconds of audio. `on_frame(frame)` receives every
+    frame of the utterance as it is read, and `on_segment(pcm)` each stretch of
+    speech as soon as a pause of `segment_pause` seconds (or the end) closes it.
+
+    A batch recogniser gets one request per segment, each without the words
+    around it, so `segment_pause` stays well above the gaps between words and
+    an utterance is split into at most `max_segments` segments.
+    """
+    frame_seconds = source.CHUNK / source.SAMPLE_RATE
+    ring = collections.deque(maxlen=max(vad.start_frames, int(pre_roll / frame_seconds)))
+    utterance = bytearray()
+    segment = bytearray()
+    segment_has_speech = False
+    segments = 0
+
+    def emit(frame, speech):
+        nonlocal segment_has_speech
+        utterance.extend(frame)
+        segment.extend(frame)
+        segment_has_speech = segment_has_speech or speech
+        if on_frame is not None:
+            on_frame(frame)
+
+    def close_segment():
+        nonlocal segment_has_speech, segments
+        if segment_has_speech and on_segment is not None:
+            on_segment(bytes(segment))
+            segments += 1
+        segment.clear()
+        segment_has_speech = False
+
+    # Wait for speech, keeping the last few frames so the onset is kept
+    waited = 0.0
+    speech_run = 0
+    while speech_run < vad.start_frames:
+        if waited >= timeout:
+            return b""
+        frame = source.stream.read(source.CHUNK)
+        waited += frame_seconds
+        speech_run = speech_run + 1 if vad.is_speech(frame) else 0
+        ring.append(frame)
+    for frame in ring:
+        emit(frame, True)
+
+    spoken = len(ring) * frame_seconds
+    silence = 0.0
+    while spoken < phrase_time_limit:
+        frame = source.stream.read(source.CHUNK)
+        speech = vad.is_speech(frame)
+        emit(frame, speech)
+        spoken += frame_seconds
+        silence = 0.0 if speech else silence + frame_seconds
+        if silence >= trailing_silence:
+            break
+        # The last segment runs to the end of the utterance
+        if silence >= segment_pause and segment_has_speech and segments < max_segments - 1:
+            close_segment()
+    close_segment()
+    return bytes(utterance)